@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 
-from distutils.core import setup
+from setuptools import setup
 
 setup(name="TileCodecs",
       version="0.1",
@@ -8,5 +8,8 @@ setup(name="TileCodecs",
       author="Gabriel Huber",
       url="https://github.com/Yepoleb/TileCodecs",
       license="GPLv3",
-      packages=["tilecodecs"]
+      packages=["tilecodecs"],
+      entry_points={
+          "console_scripts": ["tilecodecs = tilecodecs.cli:main"]
+      }
      )
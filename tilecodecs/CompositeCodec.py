@@ -30,9 +30,17 @@ class CompositeCodec(TileCodec):
         bpp = sum(c.getBitsPerPixel() for c in codecs)
 
         TileCodec.__init__(self, bpp, stride)
-        self.codecs = codecs
+        self.codecs = tuple(codecs)
+        self.freeze()
 
 
+    def getParameters(self):
+        """
+        Gets the constructor arguments of this codec as a dict.
+        """
+        return {"codecs": list(self.codecs),
+            "stride": self.stride // self.bytes_per_row}
+
     def decode(self, bits, ofs=0):
         """
         Decodes a tile.
@@ -41,6 +49,7 @@ class CompositeCodec(TileCodec):
         bits - A bytes-like object of encoded tile data
         ofs - Start offset of tile in bits
         """
+        bits = self.viewBits(bits)
         self.checkBitsLength(bits, ofs)
 
         # decode the first sub-tile
@@ -60,33 +69,29 @@ class CompositeCodec(TileCodec):
         return pixels
 
 
-    def encode(self, pixels, bits=None, ofs=0):
+    def encode(self, pixels, bits=None, ofs=0, copy=True):
         """
         Encodes a tile.
 
         Arguments:
         pixels - A list of decoded tile data
-        bits - A bytearray object to encode the data into
+        bits - A writable bytes-like object to encode the data into
         ofs - Start offset of tile in bits
+        copy - If false, the tile is written directly into bits and a
+               memoryview onto it is returned instead of a new bytearray
         """
-        if bits is None:
-            bits = b"\x00" * (self.tile_size)
-        bits = bytearray(bits)
-
-        self.checkBitsLength(bits, ofs)
+        bits = self.getEncodeBuffer(bits, ofs, copy)
 
         # encode the first sub-tile
-        bits = self.codecs[0].encode(pixels, bits, ofs)
+        self.codecs[0].encode(pixels, bits, ofs, copy=False)
         # encode remaining sub-tiles
         shift = self.codecs[0].getBitsPerPixel()
         pos = ofs
         for i in range(1, len(self.codecs)):
             pos += (self.stride+1) * self.codecs[i-1].getTileSize()
-            # shift the tile pixels
-            for i_pixel in range(64):
-                pixels[i_pixel] >>= shift
-
-            bits = self.codecs[i].encode(pixels, bits, pos)
+            # shift the tile pixels without touching the caller's list
+            tile_pixels = [pixel >> shift for pixel in pixels]
+            self.codecs[i].encode(tile_pixels, bits, pos, copy=False)
             shift += self.codecs[i].getBitsPerPixel()
 
         return bits
@@ -107,3 +112,10 @@ class PlanarCompositeCodec(CompositeCodec):
                 "for custom codecs.")
         codecs = list(PlanarCodec(x) for x in self.PREDEFINES[bpp])
         CompositeCodec.__init__(self, codecs, stride)
+
+    def getParameters(self):
+        """
+        Gets the constructor arguments of this codec as a dict.
+        """
+        return {"bpp": self.bits_per_pixel,
+            "stride": self.stride // self.bytes_per_row}
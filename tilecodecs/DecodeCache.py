@@ -0,0 +1,233 @@
+from PIL import Image
+from tilecodecs import TileCodec
+from tilecodecs.TileCodec import view_bits
+from tilecodecs import gba
+import array
+import hashlib
+import io
+import os
+import struct
+import tempfile
+import time
+
+INDEX_HEADER_FMT = "<3I"
+TILES_HEADER_FMT = "<2I"
+
+def codec_key(codec):
+    """
+    Returns a string describing a codec and its constructor arguments.
+    Equal codecs always produce the same string.
+    """
+    params = []
+    for name, value in sorted(codec.getParameters().items()):
+        if isinstance(value, (list, tuple)):
+            value = [codec_key(v) if isinstance(v, TileCodec) else v
+                for v in value]
+        params.append("{}={!r}".format(name, value))
+    cls = type(codec)
+    return "{}.{}({})".format(cls.__module__, cls.__qualname__,
+        ",".join(params))
+
+class DecodeCache(object):
+    """
+    Content addressed on-disk cache of decoded tiles, index planes and
+    rendered images. Entries are written atomically, so several processes
+    can share the same directory. The least recently used entries are
+    removed once the directory grows over max_size bytes.
+
+    The directory is only scanned when the estimated size exceeds max_size
+    or the last scan is older than scan_interval seconds. The estimate
+    counts the writes of this instance, the interval catches up with other
+    processes.
+    """
+
+    def __init__(self, directory, max_size=256*1024*1024, scan_interval=60):
+        """
+        Creates a cache in the given directory
+
+        Arguments:
+        directory - Cache directory, created if it doesn't exist
+        max_size - Maximum total size of all entries in bytes
+        scan_interval - Maximum time between two scans in seconds
+        """
+        self.directory = directory
+        self.max_size = max_size
+        self.scan_interval = scan_interval
+        # unknown until the first scan
+        self.size_estimate = None
+        self.last_scan = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def make_key(self, data, *params):
+        """
+        Hashes the input bytes together with any parameters that influence
+        the output. Codecs are described by their constructor arguments.
+        """
+        digest = hashlib.sha256(view_bits(data))
+        for param in params:
+            if isinstance(param, TileCodec):
+                param = codec_key(param)
+            digest.update(b"\x00" + repr(param).encode())
+        return digest.hexdigest()
+
+    def get_path(self, key, ext):
+        """
+        Returns the file name of a cache entry
+        """
+        return os.path.join(self.directory, key[:2], key + ext)
+
+    def get(self, key, ext):
+        """
+        Returns the stored bytes for a key or None. Hits are marked as
+        recently used.
+        """
+        path = self.get_path(key, ext)
+        try:
+            with open(path, "rb") as f:
+                content = f.read()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return content
+
+    def put(self, key, ext, content):
+        """
+        Stores bytes for a key. The file is written to a temporary name
+        first and then renamed, so readers never see partial entries.
+        """
+        path = self.get_path(key, ext)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path),
+            suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+        if self.size_estimate is not None:
+            self.size_estimate += len(content)
+        if (self.size_estimate is None or self.size_estimate > self.max_size
+                or time.monotonic() - self.last_scan > self.scan_interval):
+            self.evict()
+
+    def iter_entries(self):
+        """
+        Yields (mtime, size, path) for every cache entry
+        """
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue # removed by another process
+                yield st.st_mtime, st.st_size, path
+
+    def evict(self):
+        """
+        Removes the least recently used entries if the cache is larger than
+        max_size. Entries are removed until it is down to 90% of max_size,
+        so the next scan isn't needed right away.
+        """
+        entries = sorted(self.iter_entries())
+        total = sum(size for _, size, _ in entries)
+        if total > self.max_size:
+            target = self.max_size * 9 // 10
+        else:
+            target = total
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self.size_estimate = total
+        self.last_scan = time.monotonic()
+
+    def clear(self):
+        """
+        Removes all entries
+        """
+        for _, _, path in list(self.iter_entries()):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+        self.size_estimate = 0
+
+    def decode_tiles(self, codec, data):
+        """
+        Cached version of gba.iter_decode_tiles. Returns a list of tiles.
+        """
+        key = self.make_key(data, codec)
+        content = self.get(key, ".tiles")
+        if content is not None:
+            itemsize, count = struct.unpack_from(TILES_HEADER_FMT, content)
+            values = array.array("B" if itemsize == 1 else "I")
+            values.frombytes(content[struct.calcsize(TILES_HEADER_FMT):])
+            return [values[i:i+64].tolist() for i in range(0, count*64, 64)]
+
+        tiles = list(gba.iter_decode_tiles(codec, data))
+        values = array.array("B" if codec.getBitsPerPixel() <= 8 else "I")
+        for tile in tiles:
+            values.extend(tile)
+        header = struct.pack(TILES_HEADER_FMT, values.itemsize, len(tiles))
+        self.put(key, ".tiles", header + values.tobytes())
+        return tiles
+
+    def decode_index_image(self, data, codec, width):
+        """
+        Cached version of gba.decode_index_image
+        """
+        img, _ = self.load_index_image(data, codec, width)
+        return img
+
+    def load_index_image(self, data, codec, width):
+        """
+        Returns the cached index image and the number of decoded tiles
+        """
+        key = self.make_key(data, codec, width)
+        content = self.get(key, ".idx")
+        if content is not None:
+            img_w, img_h, count = struct.unpack_from(INDEX_HEADER_FMT,
+                content)
+            plane = content[struct.calcsize(INDEX_HEADER_FMT):]
+            img = Image.frombytes("P", (img_w, img_h), plane)
+            img.info["tile_count"] = count
+            return img, count
+
+        img = gba.decode_index_image(data, codec, width)
+        count = img.info["tile_count"]
+        header = struct.pack(INDEX_HEADER_FMT, img.width, img.height, count)
+        self.put(key, ".idx", header + img.tobytes())
+        return img, count
+
+    def decode_image(self, data, codec, palette, width, png=False):
+        """
+        Cached version of gba.decode_image. The index plane is cached and
+        colored on every call. If png is set, the rendered image is stored
+        as well.
+        """
+        if png:
+            key = self.make_key(data, codec, palette, width)
+            content = self.get(key, ".png")
+            if content is not None:
+                img = Image.open(io.BytesIO(content))
+                img.load()
+                return img
+
+        index_img, _ = self.load_index_image(data, codec, width)
+        img = gba.apply_palette(index_img, palette)
+
+        if png:
+            out = io.BytesIO()
+            img.save(out, "PNG")
+            self.put(key, ".png", out.getvalue())
+        return img
@@ -33,20 +33,20 @@ class DirectColorCodec(TileCodec):
     BIG_ENDIAN = 2
 
     # Predefined masks
-    MASK_15BPP_RGB_555 = [0x7C00, 0x03E0, 0x001F]
-    MASK_15BPP_BGR_555 = [0x001F, 0x03E0, 0x7C00]
-    MASK_16BPP_RGB_565 = [0xF800, 0x07E0, 0x001F]
-    MASK_16BPP_BGR_565 = [0x001F, 0x07E0, 0xF800]
-    MASK_16BPP_ARGB_1555 = [0x7C00, 0x03E0, 0x001F, 0x8000]
-    MASK_16BPP_ABGR_1555 = [0x001F, 0x03E0, 0x7C00, 0x8000]
-    MASK_16BPP_RGBA_5551 = [0xF800, 0x07C0, 0x003E, 0x0001]
-    MASK_16BPP_BGRA_5551 = [0x003E, 0x07C0, 0xF800, 0x0001]
-    MASK_24BPP_RGB_888 = [0xFF0000, 0x00FF00, 0x0000FF]
-    MASK_24BPP_BGR_888 = [0x0000FF, 0x00FF00, 0xFF0000]
-    MASK_32BPP_ARGB_8888 = [0x00FF0000, 0x0000FF00, 0x000000FF, 0xFF000000]
-    MASK_32BPP_ABGR_8888 = [0x000000FF, 0x0000FF00, 0x00FF0000, 0xFF000000]
-    MASK_32BPP_RGBA_8888 = [0xFF000000, 0x00FF0000, 0x0000FF00, 0x000000FF]
-    MASK_32BPP_BGRA_8888 = [0x0000FF00, 0x00FF0000, 0xFF000000, 0x000000FF]
+    MASK_15BPP_RGB_555 = (0x7C00, 0x03E0, 0x001F)
+    MASK_15BPP_BGR_555 = (0x001F, 0x03E0, 0x7C00)
+    MASK_16BPP_RGB_565 = (0xF800, 0x07E0, 0x001F)
+    MASK_16BPP_BGR_565 = (0x001F, 0x07E0, 0xF800)
+    MASK_16BPP_ARGB_1555 = (0x7C00, 0x03E0, 0x001F, 0x8000)
+    MASK_16BPP_ABGR_1555 = (0x001F, 0x03E0, 0x7C00, 0x8000)
+    MASK_16BPP_RGBA_5551 = (0xF800, 0x07C0, 0x003E, 0x0001)
+    MASK_16BPP_BGRA_5551 = (0x003E, 0x07C0, 0xF800, 0x0001)
+    MASK_24BPP_RGB_888 = (0xFF0000, 0x00FF00, 0x0000FF)
+    MASK_24BPP_BGR_888 = (0x0000FF, 0x00FF00, 0xFF0000)
+    MASK_32BPP_ARGB_8888 = (0x00FF0000, 0x0000FF00, 0x000000FF, 0xFF000000)
+    MASK_32BPP_ABGR_8888 = (0x000000FF, 0x0000FF00, 0x00FF0000, 0xFF000000)
+    MASK_32BPP_RGBA_8888 = (0xFF000000, 0x00FF0000, 0x0000FF00, 0x000000FF)
+    MASK_32BPP_BGRA_8888 = (0x0000FF00, 0x00FF0000, 0xFF000000, 0x000000FF)
 
     def __init__(self, bpp, masks, endianness=LITTLE_ENDIAN, stride=0):
         """
@@ -68,8 +68,8 @@ class DirectColorCodec(TileCodec):
             raise ValueError("Mask needs to have at least 3 values, got {}"\
                     .format(len(masks)))
         elif len(masks) == 3:
-            masks.append(0)
-        self.masks = masks
+            masks = tuple(masks) + (0,)
+        self.masks = tuple(masks)
 
         # calculate the shifts
         self.shifts = (
@@ -78,13 +78,6 @@ class DirectColorCodec(TileCodec):
             7  - msb(self.masks[2]),
             31 - msb(self.masks[3]))
 
-        self.setEndianness(endianness)
-
-
-    def setEndianness(self, endianness):
-        """
-        Sets the endianness.
-        """
         self.endianness = endianness
         if endianness == self.LITTLE_ENDIAN:
             self.start_shift = 0
@@ -93,6 +86,24 @@ class DirectColorCodec(TileCodec):
             self.start_shift = (self.bytes_per_pixel-1) * 8
             self.shift_step = -8
 
+        self.decode_tile = self.getDecoder()
+        self.freeze()
+
+
+    def withEndianness(self, endianness):
+        """
+        Returns a copy of this codec with a different endianness.
+        """
+        return self.replace(endianness=endianness)
+
+
+    def getParameters(self):
+        """
+        Gets the constructor arguments of this codec as a dict.
+        """
+        return {"bpp": self.bits_per_pixel, "masks": list(self.masks),
+            "endianness": self.endianness,
+            "stride": self.stride // self.bytes_per_row}
 
     def decode(self, bits, ofs=0):
         """
@@ -102,52 +113,65 @@ class DirectColorCodec(TileCodec):
         bits - A bytes-like object of encoded tile data
         ofs - Start offset of tile in bits
         """
+        bits = self.viewBits(bits)
         self.checkBitsLength(bits, ofs)
+        return self.decode_tile(bits, ofs)
 
-        pixels = []
 
+    def generateDecodeSource(self):
+        """
+        Generates an unrolled decode function with the byte order, masks
+        and shifts baked in.
+        """
+        color_terms = []
+        for i_mask in range(4):
+            mask = self.masks[i_mask]
+            shift = self.shifts[i_mask]
+            if mask == 0:
+                continue
+            if shift < 0:
+                color_terms.append("((v & {}) >> {})".format(mask, -shift))
+            elif shift == 0:
+                color_terms.append("(v & {})".format(mask))
+            else:
+                color_terms.append("((v & {}) << {})".format(mask, shift))
+        color_expr = " | ".join(color_terms)
+
+        lines = ["def decode(bits, ofs):", "    pixels = [0] * 64"]
         for i_row in range(8):
             # do one row of pixels
             for i_pixel in range(8):
                 # get encoded pixel
-                pixel_bytes = 0
+                byte_terms = []
                 for i_byte in range(self.bytes_per_pixel):
                     shift = (self.start_shift + i_byte*self.shift_step)
-                    pos = (ofs + (i_row*8 + i_pixel) * self.bytes_per_pixel +
+                    pos = ((i_row*8 + i_pixel) * self.bytes_per_pixel +
                         self.stride*i_row + i_byte)
-                    pixel_bytes |= bits[pos] << shift
-
-                pixel = 0
-                for i_mask in range(4):
-                    mask = self.masks[i_mask]
-                    shift = self.shifts[i_mask]
-                    color = pixel_bytes & mask
-                    if shift < 0:
-                        color >>= -shift
+                    if shift == 0:
+                        byte_terms.append("bits[ofs+{}]".format(pos))
                     else:
-                        color <<= shift
-
-                    pixel |= color
+                        byte_terms.append("(bits[ofs+{}] << {})".format(pos,
+                            shift))
+                lines.append("    v = " + " | ".join(byte_terms))
+                lines.append("    pixels[{}] = {}".format(i_row*8 + i_pixel,
+                    color_expr))
 
-                pixels.append(pixel)
+        lines.append("    return pixels")
+        return "\n".join(lines)
 
-        return pixels
 
-
-    def encode(self, pixels, bits=None, ofs=0):
+    def encode(self, pixels, bits=None, ofs=0, copy=True):
         """
         Encodes a tile.
 
         Arguments:
         pixels - A list of decoded tile data
-        bits - A bytearray object to encode the data into
+        bits - A writable bytes-like object to encode the data into
         ofs - Start offset of tile in bits
+        copy - If false, the tile is written directly into bits and a
+               memoryview onto it is returned instead of a new bytearray
         """
-        if bits is None:
-            bits = b"\x00" * (self.tile_size)
-        bits = bytearray(bits)
-
-        self.checkBitsLength(bits, ofs)
+        bits = self.getEncodeBuffer(bits, ofs, copy)
 
         for i_row in range(8):
             # do one row of pixels
@@ -99,6 +99,16 @@ class LinearCodec(TileCodec):
             self.boundary = self.pixels_per_byte
             self.step = 1
 
+        self.decode_tile = self.getDecoder()
+        self.freeze()
+
+    def getParameters(self):
+        """
+        Gets the constructor arguments of this codec as a dict.
+        """
+        return {"bpp": self.bits_per_pixel, "ordering": self.ordering,
+            "stride": self.stride // self.bytes_per_row}
+
     def decode(self, bits, ofs=0):
         """
         Decodes a tile.
@@ -107,37 +117,56 @@ class LinearCodec(TileCodec):
         bits - A bytes-like object of encoded tile data
         ofs - Start offset of tile in bits
         """
+        bits = self.viewBits(bits)
         self.checkBitsLength(bits, ofs)
+        return self.decode_tile(bits, ofs)
+
 
+    def generateDecodeSource(self):
+        """
+        Generates an unrolled decode function with all positions and
+        shifts precalculated.
+        """
+        if self.bits_per_pixel == 8 and self.stride == 0:
+            return ("def decode(bits, ofs):\n"
+                    "    return bits[ofs:ofs+64].tolist()")
+
+        lines = ["def decode(bits, ofs):"]
         pixels = []
         for i_row in range(8):
             # do one row
             for i_byte in range(self.bytes_per_row):
                 # do one byte
-                pos = ofs + i_row*(self.bytes_per_row + self.stride) + i_byte
-                byte = bits[pos]
+                pos = i_row*(self.bytes_per_row + self.stride) + i_byte
+                name = "b{}".format(pos)
+                lines.append("    {} = bits[ofs+{}]".format(name, pos))
                 for i_pixel in range(self.start_pixel, self.boundary, self.step):
                     # decode one pixel
-                    pixel = (byte >> self.bits_per_pixel*i_pixel) & self.pixel_mask
-                    pixels.append(pixel)
+                    shift = self.bits_per_pixel*i_pixel
+                    if self.bits_per_pixel == 8:
+                        pixels.append(name)
+                    elif shift == 0:
+                        pixels.append("{} & {}".format(name, self.pixel_mask))
+                    else:
+                        pixels.append("({} >> {}) & {}".format(name, shift,
+                            self.pixel_mask))
 
-        return pixels
+        lines.append("    return [{}]".format(", ".join(pixels)))
+        return "\n".join(lines)
 
 
-    def encode(self, pixels, bits=None, ofs=0):
+    def encode(self, pixels, bits=None, ofs=0, copy=True):
         """
         Encodes a tile.
 
         Arguments:
         pixels - A list of decoded tile data
-        bits - A bytearray object to encode the data into
+        bits - A writable bytes-like object to encode the data into
         ofs - Start offset of tile in bits
+        copy - If false, the tile is written directly into bits and a
+               memoryview onto it is returned instead of a new bytearray
         """
-        if bits is None:
-            bits = b"\x00" * (self.tile_size)
-        bits = bytearray(bits)
-
-        self.checkBitsLength(bits, ofs)
+        bits = self.getEncodeBuffer(bits, ofs, copy)
 
         for i_row in range(8):
             # do one row
@@ -147,7 +176,8 @@ class LinearCodec(TileCodec):
                 byte = 0
                 for i_pixel in range(self.start_pixel, self.boundary, self.step):
                     # encode one pixel
-                    pixel_pos = i_row*8 + i_byte*self.pixels_per_byte + i_pixel
+                    pixel_pos = (i_row*8 + i_byte*self.pixels_per_byte +
+                            (i_pixel - self.start_pixel)*self.step)
                     byte |= (pixels[pixel_pos] & self.pixel_mask) << \
                             (i_pixel*self.bits_per_pixel)
                 bits[pos] = byte
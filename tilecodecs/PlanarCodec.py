@@ -32,21 +32,19 @@ class PlanarCodec(TileCodec):
             raise ValueError("No bpp or bp_offset value given")
 
         TileCodec.__init__(self, bpp, stride)
-        self.bp_offsets = bp_offsets
+        self.bp_offsets = tuple(bp_offsets)
 
-        # Precalculate all bit patterns
-        self.pixels_lookup = []
-        for i in range(8):
-            self.pixels_lookup.append([])
-            # do one bitplane
-            for j in range(265):
-                self.pixels_lookup[i].append([])
-                # do one byte
-                for k in range(8):
-                    # do one pixel
-                    self.pixels_lookup[i][j].append(((j >> (7-k)) & 1) << i)
+        self.decode_tile = self.getDecoder()
+        self.freeze()
 
 
+    def getParameters(self):
+        """
+        Gets the constructor arguments of this codec as a dict.
+        """
+        return {"bp_offsets": list(self.bp_offsets),
+            "stride": self.stride // self.bytes_per_row}
+
     def decode(self, bits, ofs=0):
         """
         Decodes a tile.
@@ -55,43 +53,61 @@ class PlanarCodec(TileCodec):
         bits - A bytes-like object of encoded tile data
         ofs - Start offset of tile in bits
         """
+        bits = self.viewBits(bits)
         self.checkBitsLength(bits, ofs)
+        return self.decode_tile(bits, ofs)
 
-        pixels = []
 
+    def generateDecodeSource(self):
+        """
+        Generates an unrolled decode function. Every pixel is an expression
+        that moves its bit of each bitplane directly into place.
+        """
+        lines = ["def decode(bits, ofs):"]
+        pixels = []
         for i_row in range(8):
             # do one row of pixels
-            bitplane = []
-            pos = ofs + i_row * (self.bytes_per_row + self.stride)
-            for i_byte in range(self.bytes_per_row):
-                # get bits for bitplane j
-                bitplane.append(bits[pos+self.bp_offsets[i_byte]])
+            pos = i_row * (self.bytes_per_row + self.stride)
+            names = []
+            for k in range(self.bits_per_pixel):
+                # get bits for bitplane k
+                name = "p{}_{}".format(i_row, k)
+                lines.append("    {} = bits[ofs+{}]".format(name,
+                    pos + self.bp_offsets[k]))
+                names.append(name)
 
             for i_pixel in range(8):
                 # decode one pixel
-                pixel = 0
-                for k in range(self.bits_per_pixel):
-                    # add bitplane k
-                    pixel |= self.pixels_lookup[k][bitplane[k]][i_pixel]
-                pixels.append(pixel)
-
-        return pixels
-
-
-    def encode(self, pixels, bits=None, ofs=0):
+                terms = []
+                for k, name in enumerate(names):
+                    # bit (7-i_pixel) of bitplane k becomes bit k
+                    shift = 7 - i_pixel - k
+                    if shift > 0:
+                        terms.append("(({} >> {}) & {})".format(name, shift,
+                            1 << k))
+                    elif shift == 0:
+                        terms.append("({} & {})".format(name, 1 << k))
+                    else:
+                        terms.append("(({} << {}) & {})".format(name, -shift,
+                            1 << k))
+                pixels.append(" | ".join(terms))
+
+        lines.append("    return [{}]".format(", ".join(pixels)))
+        return "\n".join(lines)
+
+
+    def encode(self, pixels, bits=None, ofs=0, copy=True):
         """
         Encodes a bitplaned tile.
 
         Arguments:
         pixels - A list of decoded tile data
-        bits - A bytearray object to encode the data into
+        bits - A writable bytes-like object to encode the data into
         ofs - Start offset of tile in bits
+        copy - If false, the tile is written directly into bits and a
+               memoryview onto it is returned instead of a new bytearray
         """
-        if bits is None:
-            bits = b"\x00" * (self.tile_size)
-        bits = bytearray(bits)
-
-        self.checkBitsLength(bits, ofs)
+        bits = self.getEncodeBuffer(bits, ofs, copy)
 
         for i_row in range(8):
             # do one row
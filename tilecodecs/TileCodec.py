@@ -1,8 +1,33 @@
+def view_bits(bits, writable=False):
+    """
+    Returns a flat unsigned byte memoryview of a bytes-like object. Views that
+    already have this layout are returned unchanged.
+
+    Arguments:
+    bits - A bytes-like object
+    writable - Raise a TypeError if the buffer is read-only
+    """
+    view = memoryview(bits)
+    if view.format != "B" or view.ndim != 1:
+        if not view.c_contiguous:
+            raise ValueError("Bits buffer has to be contiguous")
+        view = view.cast("B")
+    if writable and view.readonly:
+        raise TypeError("Bits buffer is read-only")
+    return view
+
+# Generated decode functions, shared by all codecs with equal parameters
+_decoder_cache = {}
+
 class TileCodec(object):
     """
     Abstract class for 8x8 ("atomic") tile codecs.
     To add a new tile format, simply extend this class and implement
     decode() and encode().
+
+    Codecs are immutable once the constructor calls freeze(), so a single
+    instance can be shared between threads. Use replace() to get a codec
+    with a different configuration.
     """
 
     def __init__(self, bpp, stride=0):
@@ -20,6 +45,27 @@ class TileCodec(object):
         self.tile_size = self.bytes_per_row * 8 # 8 rows per tile
         self.color_count = 1 << bpp
 
+    def __setattr__(self, name, value):
+        if getattr(self, "_frozen", False):
+            raise AttributeError("{} is immutable, use replace() to change "
+                "its configuration".format(type(self).__name__))
+        object.__setattr__(self, name, value)
+
+    def freeze(self):
+        """
+        Makes the codec immutable. Called at the end of the constructor.
+        """
+        object.__setattr__(self, "_frozen", True)
+
+    def replace(self, **changes):
+        """
+        Returns a new codec of the same type with some constructor arguments
+        replaced. Example: codec.replace(stride=3)
+        """
+        params = self.getParameters()
+        params.update(changes)
+        return type(self)(**params)
+
 
     def decode(self, bits, ofs=0):
         """
@@ -32,14 +78,16 @@ class TileCodec(object):
         raise NotImplementedError
 
 
-    def encode(self, pixels, bits=None, ofs=0):
+    def encode(self, pixels, bits=None, ofs=0, copy=True):
         """
         Encodes a tile. Has to be implemented by subclasses.
 
         Arguments:
         pixels - A list of decoded tile data
-        bits - A bytearray object to encode the data into
+        bits - A writable bytes-like object to encode the data into
         ofs - Start offset of tile in bits
+        copy - If false, the tile is written directly into bits and a
+               memoryview onto it is returned instead of a new bytearray
         """
         raise NotImplementedError
 
@@ -51,6 +99,34 @@ class TileCodec(object):
             raise IndexError("Bits input too short. Required {}b, got {}b"\
                 .format(ofs+self.tile_size, len(bits)))
 
+    def viewBits(self, bits, writable=False):
+        """
+        Returns a flat unsigned byte memoryview of any object supporting the
+        buffer protocol (bytes, bytearray, mmap, memoryview, array, ...)
+        without copying it.
+
+        Arguments:
+        bits - A bytes-like object
+        writable - Raise a TypeError if the buffer is read-only
+        """
+        return view_bits(bits, writable)
+
+    def getEncodeBuffer(self, bits, ofs, copy=True):
+        """
+        Prepares the output buffer for encode(). Returns a new bytearray if
+        copy is set or no bits were given, otherwise a writable memoryview
+        onto the caller's storage.
+        """
+        if bits is None:
+            bits = bytearray(ofs + self.tile_size)
+        elif copy:
+            bits = bytearray(bits)
+        else:
+            bits = self.viewBits(bits, writable=True)
+
+        self.checkBitsLength(bits, ofs)
+        return bits
+
     def getBitsPerPixel(self):
         """
         Gets the # of bits per pixel for the tile format.
@@ -77,3 +153,35 @@ class TileCodec(object):
         Gets the size in bytes of one tile encoded in this format.
         """
         return self.tile_size
+
+
+    def getParameters(self):
+        """
+        Gets the constructor arguments of this codec as a dict. Has to be
+        implemented by subclasses.
+        """
+        raise NotImplementedError
+
+
+    def generateDecodeSource(self):
+        """
+        Returns the Python source of a function decode(bits, ofs) that is
+        specialised for this codec's configuration. Subclasses that
+        implement this can use getDecoder() in decode().
+        """
+        raise NotImplementedError
+
+
+    def getDecoder(self):
+        """
+        Gets the generated decode function for this configuration. It is
+        compiled on first use and cached by codec type and parameters.
+        """
+        key = (type(self), repr(sorted(self.getParameters().items())))
+        decoder = _decoder_cache.get(key)
+        if decoder is None:
+            namespace = {}
+            exec(self.generateDecodeSource(), namespace)
+            decoder = namespace["decode"]
+            _decoder_cache[key] = decoder
+        return decoder
@@ -0,0 +1,100 @@
+from tilecodecs.TileCodec import view_bits
+
+class TileSearch(object):
+    """
+    Finds where known tiles are stored in a ROM. The query tiles are encoded
+    with every candidate codec and indexed by their encoded bytes. A single
+    pass over the ROM then looks up each tile sized window in the index and
+    counts matching tiles for every possible start offset, for all queries
+    and codecs at once.
+    """
+
+    def __init__(self, codecs, max_mismatches=0, skip_blank=True):
+        """
+        Creates an empty search
+
+        Arguments:
+        codecs - List of candidate TileCodecs
+        max_mismatches - Number of query tiles that may differ in a match
+        skip_blank - Ignore query tiles that encode to a single repeated
+                     byte, they match almost everywhere in a ROM
+        """
+        self.codecs = list(codecs)
+        self.max_mismatches = max_mismatches
+        self.skip_blank = skip_blank
+        self.queries = []
+        # {tile_size: {encoded tile: [(query_id, codec_id, tile_i), ...]}}
+        self.index = {}
+
+    def add_query(self, tiles):
+        """
+        Adds a list of decoded tiles (or a TileSet) to look for. Returns the
+        query id used in the search results.
+        """
+        query_id = len(self.queries)
+        tiles = list(tiles)
+        counts = []
+        for codec_id, codec in enumerate(self.codecs):
+            tile_size = codec.getTileSize()
+            blocks = self.index.setdefault(tile_size, {})
+            indexed = 0
+            for tile_i, tile in enumerate(tiles):
+                encoded = bytes(codec.encode(tile))
+                if self.skip_blank and encoded.count(encoded[0]) == tile_size:
+                    continue
+                blocks.setdefault(encoded, []).append(
+                    (query_id, codec_id, tile_i))
+                indexed += 1
+            counts.append(indexed)
+
+        self.queries.append((len(tiles), counts))
+        return query_id
+
+    def search(self, rom, align=4):
+        """
+        Searches a ROM for all queries. Returns a list of
+        (query_id, offset, codec, quality) tuples sorted by quality, where
+        quality is the fraction of indexed query tiles that matched.
+
+        Arguments:
+        rom - A bytes-like object, for example a memory mapped ROM
+        align - Step between checked offsets, in bytes
+        """
+        rom = view_bits(rom)
+        rom_size = len(rom)
+        votes = {}
+
+        sizes = sorted(self.index.items())
+        for ofs in range(0, rom_size, align):
+            for tile_size, blocks in sizes:
+                if ofs + tile_size > rom_size:
+                    break
+                hits = blocks.get(bytes(rom[ofs:ofs+tile_size]))
+                if hits is None:
+                    continue
+                for query_id, codec_id, tile_i in hits:
+                    key = (query_id, codec_id, ofs - tile_i*tile_size)
+                    votes[key] = votes.get(key, 0) + 1
+
+        results = []
+        for (query_id, codec_id, start), count in votes.items():
+            tile_count, indexed = self.queries[query_id]
+            tile_size = self.codecs[codec_id].getTileSize()
+            if start < 0 or start + tile_count*tile_size > rom_size:
+                continue
+            if indexed[codec_id] - count > self.max_mismatches:
+                continue
+            quality = count / indexed[codec_id]
+            results.append((query_id, start, self.codecs[codec_id], quality))
+
+        results.sort(key=lambda r: (-r[3], r[0], r[1]))
+        return results
+
+def find_tiles(rom, tiles, codecs, max_mismatches=0, align=4):
+    """
+    Searches a single ROM for a single set of tiles. Returns a list of
+    (offset, codec, quality) tuples, best matches first.
+    """
+    search = TileSearch(codecs, max_mismatches)
+    search.add_query(tiles)
+    return [r[1:] for r in search.search(rom, align)]
@@ -0,0 +1,165 @@
+from tilecodecs.TileCodec import view_bits
+
+TILE_PIXELS = 64
+
+class TileSet(object):
+    """
+    Compact container for decoded 8x8 tiles with up to 8 bits per pixel.
+    All tiles are stored in one bytearray with 64 bytes per tile. Indexing
+    returns a read-only memoryview of a tile, which can be used anywhere a
+    list of pixels is expected. Use tile_key() for dict keys.
+    """
+
+    __slots__ = ("data", "count")
+
+    def __init__(self, count=0, data=None):
+        """
+        TileSet constructor
+
+        Arguments:
+        count - Number of tiles
+        data - Optional bytes-like object with count*64 pixel values
+        """
+        if data is None:
+            self.data = bytearray(count * TILE_PIXELS)
+        elif len(data) == count * TILE_PIXELS:
+            self.data = bytearray(data)
+        else:
+            raise ValueError(("Wrong tile data size. Should be {}, is {}."
+                .format(count * TILE_PIXELS, len(data))))
+        self.count = count
+
+    @classmethod
+    def from_tiles(cls, tiles):
+        """
+        Creates a TileSet from an iterable of 64 pixel tiles
+        """
+        data = bytearray()
+        for tile in tiles:
+            if len(tile) != TILE_PIXELS:
+                raise ValueError("Tiles have to contain 64 pixels, got {}"
+                    .format(len(tile)))
+            data += bytes(tile)
+        return cls(len(data) // TILE_PIXELS, data)
+
+    @classmethod
+    def decode(cls, codec, bits, ofs=0, count=None):
+        """
+        Decodes tiles with a TileCodec directly into a new TileSet
+
+        Arguments:
+        codec - TileCodec with at most 8 bits per pixel
+        bits - A bytes-like object of encoded tile data
+        ofs - Offset of the first tile in bits
+        count - Number of tiles, defaults to all remaining tiles
+        """
+        if codec.getBitsPerPixel() > 8:
+            raise ValueError("TileSet needs a codec with at most 8bpp")
+
+        bits = view_bits(bits)
+        tile_size = codec.getTileSize()
+        if count is None:
+            count = -(-(len(bits) - ofs) // tile_size)
+
+        tileset = cls(count)
+        data = tileset.data
+        for i in range(count):
+            pos = i * TILE_PIXELS
+            data[pos:pos+TILE_PIXELS] = codec.decode(bits, ofs + i*tile_size)
+        return tileset
+
+    def encode(self, codec, bits=None, ofs=0):
+        """
+        Encodes all tiles with a TileCodec. Returns a new bytearray, or a
+        memoryview onto bits if bits is given.
+
+        Arguments:
+        codec - TileCodec instance
+        bits - Optional writable bytes-like object to encode into
+        ofs - Offset of the first tile in bits
+        """
+        tile_size = codec.getTileSize()
+        if bits is None:
+            bits = bytearray(ofs + self.count * tile_size)
+            copy_result = True
+        else:
+            copy_result = False
+        out = view_bits(bits, writable=True)
+        for i in range(self.count):
+            codec.encode(self[i], out, ofs + i*tile_size, copy=False)
+        return bits if copy_result else out
+
+    def __len__(self):
+        return self.count
+
+    def _check_index(self, index):
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("Tile index out of range")
+        return index * TILE_PIXELS
+
+    def __getitem__(self, index):
+        """
+        Returns a read-only view of a tile without copying it
+        """
+        pos = self._check_index(index)
+        return memoryview(self.data)[pos:pos+TILE_PIXELS].toreadonly()
+
+    def __setitem__(self, index, tile):
+        """
+        Replaces the pixels of a tile
+        """
+        if len(tile) != TILE_PIXELS:
+            raise ValueError("Tiles have to contain 64 pixels, got {}"
+                .format(len(tile)))
+        pos = self._check_index(index)
+        self.data[pos:pos+TILE_PIXELS] = bytes(tile)
+
+    def __iter__(self):
+        view = memoryview(self.data).toreadonly()
+        for pos in range(0, self.count * TILE_PIXELS, TILE_PIXELS):
+            yield view[pos:pos+TILE_PIXELS]
+
+    def __eq__(self, other):
+        if not isinstance(other, TileSet):
+            return NotImplemented
+        return self.data == other.data
+
+    __hash__ = None
+
+    def tile_key(self, index):
+        """
+        Returns the pixels of a tile as bytes, usable as a dict key
+        """
+        pos = self._check_index(index)
+        return bytes(self.data[pos:pos+TILE_PIXELS])
+
+    def tile_hash(self, index):
+        """
+        Returns the hash of a single tile's pixels
+        """
+        return hash(self.tile_key(index))
+
+    def tiles_equal(self, index_a, index_b):
+        """
+        Compares the pixels of two tiles
+        """
+        return self[index_a] == self[index_b]
+
+    def find(self, tile):
+        """
+        Returns the index of the first tile with the same pixels, or -1
+        """
+        tile = bytes(tile)
+        for i, other in enumerate(self):
+            if other == tile:
+                return i
+        return -1
+
+    def to_lists(self):
+        """
+        Returns the tiles as a list of pixel lists
+        """
+        return [list(self.data[pos:pos+TILE_PIXELS])
+            for pos in range(0, self.count * TILE_PIXELS, TILE_PIXELS)]
@@ -0,0 +1,122 @@
+from tilecodecs import Pixmap
+from tilecodecs.TileCodec import view_bits
+
+class TileSheet(Pixmap):
+    """
+    Pixmap backed by encoded tile data. Edits are tracked per 8x8 tile and
+    sync() writes only the changed tiles back into the backing buffer.
+    """
+
+    def __init__(self, codec, bits, width, ofs=0, count=None):
+        """
+        Decodes a tile sheet from a writable buffer.
+
+        Arguments:
+        codec - TileCodec used to decode and encode the tiles
+        bits - A writable bytes-like object holding the encoded tiles, for
+               example a bytearray or a writable mmap of the ROM
+        width - Width of the sheet in tiles
+        ofs - Offset of the first tile in bits
+        count - Number of tiles, defaults to all remaining tiles in bits
+        """
+        self.codec = codec
+        self.bits = view_bits(bits, writable=True)
+        self.ofs = ofs
+        tile_size = codec.getTileSize()
+        if count is None:
+            count = (len(self.bits) - ofs) // tile_size
+        self.tile_count = count
+        self.tiles_w = width
+        self.tiles_h = -(-count // width)
+        self.dirty = set()
+
+        Pixmap.__init__(self, (width*8, self.tiles_h*8))
+        for tile_i in range(count):
+            tile = codec.decode(self.bits, ofs + tile_i*tile_size)
+            self._write_tile(tile_i, tile)
+
+    def _tile_origin(self, tile_i):
+        """
+        Returns the position of the top left pixel of a tile in self.pixels
+        """
+        tile_x = tile_i % self.tiles_w
+        tile_y = tile_i // self.tiles_w
+        return tile_y*8*self.width + tile_x*8
+
+    def _write_tile(self, tile_i, tile):
+        """
+        Copies 64 tile pixels into the sheet without marking it dirty
+        """
+        pos = self._tile_origin(tile_i)
+        for row in range(8):
+            self.pixels[pos:pos+8] = tile[row*8:row*8+8]
+            pos += self.width
+
+    def set_data(self, data):
+        """
+        Sets the pixel data to a new list of values and marks every tile as
+        dirty
+        """
+        Pixmap.set_data(self, data)
+        self.dirty.update(range(self.tile_count))
+
+    def set_pixel(self, px, loc):
+        """
+        Sets a single pixel in the image and marks its tile as dirty
+
+        Arguments:
+        px - Pixel value
+        loc - Location tuple (x, y)
+        """
+        x, y = loc
+        self.pixels[y * self.width + x] = px
+        tile_i = (y // 8) * self.tiles_w + x // 8
+        if tile_i < self.tile_count:
+            self.dirty.add(tile_i)
+
+    def get_tile(self, tile_i):
+        """
+        Returns the 64 pixels of a tile as a list
+        """
+        pos = self._tile_origin(tile_i)
+        tile = []
+        for row in range(8):
+            tile += self.pixels[pos:pos+8]
+            pos += self.width
+        return tile
+
+    def set_tile(self, tile_i, tile):
+        """
+        Replaces the pixels of a tile and marks it as dirty
+        """
+        if len(tile) != 64:
+            raise ValueError("Tiles have to contain 64 pixels, got {}"
+                .format(len(tile)))
+        self._write_tile(tile_i, tile)
+        self.dirty.add(tile_i)
+
+    def mark_dirty(self, tile_i):
+        """
+        Marks a tile as changed. Only needed after modifying self.pixels
+        directly.
+        """
+        self.dirty.add(tile_i)
+
+    def is_dirty(self):
+        """
+        Returns True if any tile changed since the last sync
+        """
+        return bool(self.dirty)
+
+    def sync(self):
+        """
+        Encodes all changed tiles in place into the backing buffer. Returns
+        the sorted list of tile indices that were written.
+        """
+        tile_size = self.codec.getTileSize()
+        synced = sorted(self.dirty)
+        for tile_i in synced:
+            self.codec.encode(self.get_tile(tile_i), self.bits,
+                self.ofs + tile_i*tile_size, copy=False)
+        self.dirty.clear()
+        return synced
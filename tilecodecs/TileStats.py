@@ -0,0 +1,122 @@
+from tilecodecs.TileSet import TileSet
+import collections
+import struct
+
+FLIP_NONE = 0
+FLIP_H = 1
+FLIP_V = 2
+FLIP_HV = FLIP_H | FLIP_V
+
+def flip_variants(tile):
+    """
+    Returns the pixels of a tile as bytes in all four flip variants,
+    indexed by FLIP_NONE, FLIP_H, FLIP_V and FLIP_HV.
+    """
+    rows = [bytes(tile[i:i+8]) for i in range(0, 64, 8)]
+    h_rows = [row[::-1] for row in rows]
+    return (b"".join(rows), b"".join(h_rows),
+        b"".join(reversed(rows)), b"".join(reversed(h_rows)))
+
+class TileStats(object):
+    """
+    Deduplication and color statistics for a bank of tiles. All numbers
+    are collected in a single pass over the decoded tiles.
+
+    Attributes:
+    tile_count - Number of tiles
+    blank_tiles - Indices of tiles whose pixels are all 0
+    unique_count - Number of distinct tiles
+    unique_with_flips - Number of distinct tiles if flipped copies are
+                        considered equal
+    groups - Lists of (tile index, flip) for each set of tiles that are
+             equal up to flipping. The flip is relative to the first tile.
+    colors - collections.Counter of palette indices for each tile
+    color_totals - Counter of palette indices over all tiles
+    bank_usage - Counter of how many distinct tiles the tilemap uses with
+                 each 16 color palette bank, empty without a tilemap
+    """
+
+    def __init__(self, codec, data, ofs=0, count=None, tilemap=None):
+        """
+        Decodes and analyzes tiles
+
+        Arguments:
+        codec - TileCodec with at most 8 bits per pixel
+        data - A bytes-like object of encoded tile data
+        ofs - Offset of the first tile in data
+        count - Number of tiles, defaults to all remaining tiles
+        tilemap - Optional GBA text tilemap referencing the tiles, used for
+                  the palette bank usage of 4bpp tiles
+        """
+        tiles = TileSet.decode(codec, data, ofs, count)
+        self.tile_count = len(tiles)
+        self.blank_tiles = []
+        self.colors = []
+        self.color_totals = collections.Counter()
+        self.bank_usage = collections.Counter()
+
+        exact = set()
+        # {canonical pixels: (index into self.groups, pixels of first tile)}
+        canonical = {}
+        self.groups = []
+        blank = bytes(64)
+
+        for tile_i, tile in enumerate(tiles):
+            pixels = bytes(tile)
+            exact.add(pixels)
+            if pixels == blank:
+                self.blank_tiles.append(tile_i)
+
+            colors = collections.Counter(pixels)
+            self.colors.append(colors)
+            self.color_totals.update(colors)
+
+            variants = flip_variants(pixels)
+            key = min(variants)
+            found = canonical.get(key)
+            if found is None:
+                canonical[key] = (len(self.groups), pixels)
+                self.groups.append([(tile_i, FLIP_NONE)])
+            else:
+                group_i, first = found
+                flip = variants.index(first)
+                self.groups[group_i].append((tile_i, flip))
+
+        if tilemap is not None:
+            # Entry layout: http://www.coranac.com/tonc/text/regbg.htm
+            used = set((entry & 0x3FF, entry >> 12)
+                for entry, in struct.iter_unpack("<H", tilemap))
+            self.bank_usage.update(bank for _, bank in used)
+
+        self.unique_count = len(exact)
+        self.unique_with_flips = len(self.groups)
+
+    def get_duplicate_groups(self):
+        """
+        Returns only the groups that contain more than one tile
+        """
+        return [group for group in self.groups if len(group) > 1]
+
+    def get_flipped_duplicates(self):
+        """
+        Returns the number of tiles that are flipped copies of an earlier
+        tile, but not exact copies
+        """
+        return sum(1 for group in self.groups for _, flip in group
+            if flip != FLIP_NONE)
+
+    def summary(self):
+        """
+        Returns the main numbers as a dict
+        """
+        return {
+            "tiles": self.tile_count,
+            "blank": len(self.blank_tiles),
+            "unique": self.unique_count,
+            "unique_with_flips": self.unique_with_flips,
+            "duplicates": self.tile_count - self.unique_count,
+            "flipped_duplicates": self.get_flipped_duplicates(),
+            "duplicate_groups": len(self.get_duplicate_groups()),
+            "colors_used": len(self.color_totals),
+            "banks_used": sorted(self.bank_usage),
+        }
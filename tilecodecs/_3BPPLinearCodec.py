@@ -15,6 +15,13 @@ class _3BPPLinearCodec(TileCodec):
                  for MODE_2D. I have no idea why this exists
         """
         TileCodec.__init__(self, 3, stride)
+        self.freeze()
+
+    def getParameters(self):
+        """
+        Gets the constructor arguments of this codec as a dict.
+        """
+        return {"stride": self.stride // self.bytes_per_row}
 
     def decode(self, bits, ofs=0):
         """
@@ -24,12 +31,13 @@ class _3BPPLinearCodec(TileCodec):
         bits - A bytes-like object of encoded tile data
         ofs - Start offset of tile in bits
         """
+        bits = self.viewBits(bits)
         self.checkBitsLength(bits, ofs)
 
         pixels = []
         for i_row in range(8):
             # do one row
-            pos = i_row * self.bytes_per_row + i_row * self.stride
+            pos = ofs + i_row * (self.bytes_per_row + self.stride)
             byte1 = bits[pos+0] # byte 1: 0001 1122
             byte2 = bits[pos+1] # byte 2: 2333 4445
             byte3 = bits[pos+2] # byte 3: 5566 6777
@@ -45,32 +53,30 @@ class _3BPPLinearCodec(TileCodec):
         return pixels
 
 
-    def encode(self, pixels, bits=None, ofs=0):
+    def encode(self, pixels, bits=None, ofs=0, copy=True):
         """
         Encodes a tile.
 
         Arguments:
         pixels - A list of decoded tile data
-        bits - A bytearray object to encode the data into
+        bits - A writable bytes-like object to encode the data into
         ofs - Start offset of tile in bits
+        copy - If false, the tile is written directly into bits and a
+               memoryview onto it is returned instead of a new bytearray
         """
-        if bits is None:
-            bits = b"\x00" * (self.tile_size)
-        bits = bytearray(bits)
-
-        self.checkBitsLength(bits, ofs)
+        bits = self.getEncodeBuffer(bits, ofs, copy)
 
         for i_row in range(8):
             # do one row
-            pos = i_row * self.bytes_per_row + i_row * self.stride
+            pos = ofs + i_row * (self.bytes_per_row + self.stride)
             pxpos = i_row * 8
             byte1 = (pixels[pxpos+0] & 7) << 5
             byte1 |= (pixels[pxpos+1] & 7) << 2
-            byte1 |= (pixels[pxpos+1] & 6) >> 1
+            byte1 |= (pixels[pxpos+2] & 6) >> 1
             byte2 = (pixels[pxpos+2] & 1) << 7
             byte2 |= (pixels[pxpos+3] & 7) << 4
             byte2 |= (pixels[pxpos+4] & 7) << 1
-            byte2 |= (pixels[pxpos+4] & 4) >> 2
+            byte2 |= (pixels[pxpos+5] & 4) >> 2
             byte3 = (pixels[pxpos+5] & 3) << 6
             byte3 |= (pixels[pxpos+6] & 7) << 3
             byte3 |= (pixels[pxpos+7] & 7)
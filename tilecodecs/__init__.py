@@ -1,12 +1,21 @@
-from tilecodecs.TileCodec import TileCodec
+from tilecodecs.TileCodec import TileCodec, view_bits
 from tilecodecs.PlanarCodec import PlanarCodec
 from tilecodecs.LinearCodec import LinearCodec
 from tilecodecs._3BPPLinearCodec import _3BPPLinearCodec
 from tilecodecs.CompositeCodec import CompositeCodec, PlanarCompositeCodec
 from tilecodecs.DirectColorCodec import DirectColorCodec
 from tilecodecs.Pixmap import Pixmap
+from tilecodecs.TileSheet import TileSheet
+from tilecodecs.TileSet import TileSet
+from tilecodecs.TileSearch import TileSearch, find_tiles
+from tilecodecs.TileStats import TileStats
+from tilecodecs import gba_compression
 
 try:
     from tilecodecs import gba
+    from tilecodecs import gba_sprites
+    from tilecodecs import gba_scene
+    from tilecodecs.DecodeCache import DecodeCache
+    from tilecodecs import gba_async
 except:
     pass
@@ -0,0 +1,4 @@
+import sys
+from tilecodecs.cli import main
+
+sys.exit(main())
@@ -0,0 +1,213 @@
+from PIL import Image
+from tilecodecs import TileCodec, LinearCodec, DirectColorCodec
+from tilecodecs import gba
+from tilecodecs import gba_compression
+import tilecodecs
+import concurrent.futures
+import argparse
+import array
+import math
+import json
+import mmap
+import sys
+import time
+
+"""
+Batch extraction from a JSON manifest. The manifest is a list of jobs (or an
+object with a "jobs" list), each job looks like this:
+
+{
+    "rom": "game.gba",
+    "offset": 1234,
+    "count": 256,            # number of tiles, defaults to all whole tiles
+                             # in the rest of the ROM
+    "codec": "gba4",         # or {"type": "LinearCodec", "bpp": 4, ...}
+    "palette": {"offset": 5678, "bank": 0},
+    "width": 16,             # sheet width in tiles
+    "compressed": false,     # data starts with a BIOS compression header
+    "output": "out.png"      # .png for images, anything else for raw indices
+}
+
+Palettes are either a list of [r, g, b] colors or an object with the keys
+"file" (defaults to the job's ROM), "offset", "bank" and "alpha". Without a
+palette a grayscale ramp is used.
+
+DirectColorCodec jobs ignore the palette. Their raw output holds one little
+endian ARGB word per pixel instead of one palette index byte. Codecs without
+an alpha mask produce opaque pixels.
+"""
+
+CODEC_ALIASES = {
+    "gba4": {"type": "LinearCodec", "bpp": 4,
+        "ordering": LinearCodec.REVERSE_ORDER},
+    "gba8": {"type": "LinearCodec", "bpp": 8},
+}
+
+# ROMs mapped by the current worker process, shared by all of its jobs
+_roms = {}
+
+def codec_from_descriptor(desc):
+    """
+    Creates a codec from an alias or a dict with a "type" key and the
+    constructor arguments returned by TileCodec.getParameters().
+    """
+    if isinstance(desc, str):
+        if desc not in CODEC_ALIASES:
+            raise ValueError("Unknown codec alias {}".format(desc))
+        desc = CODEC_ALIASES[desc]
+
+    params = dict(desc)
+    cls = getattr(tilecodecs, params.pop("type"), None)
+    if not (isinstance(cls, type) and issubclass(cls, TileCodec)):
+        raise ValueError("Unknown codec type {}".format(desc["type"]))
+    if "codecs" in params:
+        params["codecs"] = [codec_from_descriptor(c)
+            for c in params["codecs"]]
+    return cls(**params)
+
+def open_rom(path):
+    """
+    Returns a read-only memoryview of a ROM. Every file is mapped only once
+    per process.
+    """
+    if path not in _roms:
+        with open(path, "rb") as f:
+            _roms[path] = memoryview(mmap.mmap(f.fileno(), 0,
+                access=mmap.ACCESS_READ))
+    return _roms[path]
+
+def load_palette(desc, rom_path, color_count):
+    """
+    Loads the palette of a job. See the module comment for the format.
+    """
+    if desc is None:
+        step = 255 // max(color_count - 1, 1)
+        return [(i*step, i*step, i*step) for i in range(color_count)]
+    if isinstance(desc, list):
+        return [tuple(c) for c in desc]
+
+    data = open_rom(desc.get("file", rom_path))
+    bank_count = max(color_count // 16, 1)
+    start = desc.get("offset", 0) + desc.get("bank", 0) * gba.PALETTE_SIZE
+    end = start + bank_count * gba.PALETTE_SIZE
+    palette = []
+    for pal in gba.iter_decode_palettes(data[start:end],
+            desc.get("alpha", False)):
+        palette += pal
+    return palette
+
+def decode_direct_image(data, codec, width):
+    """
+    Decodes direct color tiles into an RGBA image. The width is meassured
+    in tiles. Returns the image and the little endian ARGB pixel data.
+    """
+    tiles = tuple(gba.iter_decode_tiles(codec, data))
+    # codecs without an alpha mask decode to alpha 0
+    alpha = 0xFF000000 if codec.masks[3] == 0 else 0
+    height = int(math.ceil(len(tiles) / width))
+    img_width = width * 8
+    plane = array.array("I", [0]) * (img_width * height * 8)
+    for tile_i, tile in enumerate(tiles):
+        pos = (tile_i // width) * 8 * img_width + (tile_i % width) * 8
+        for row in range(0, 64, 8):
+            plane[pos:pos+8] = array.array("I",
+                [c | alpha for c in tile[row:row+8]])
+            pos += img_width
+
+    if sys.byteorder == "big":
+        plane.byteswap()
+    raw = plane.tobytes()
+    img = Image.frombytes("RGBA", (img_width, height*8), raw, "raw", "BGRA")
+    return img, raw
+
+def run_job(job):
+    """
+    Runs a single job. Returns the output path and the time taken in
+    seconds.
+    """
+    start_time = time.perf_counter()
+    codec = codec_from_descriptor(job["codec"])
+    rom = open_rom(job["rom"])
+    offset = job.get("offset", 0)
+
+    if job.get("compressed", False):
+        data = gba_compression.decompress(rom, offset)
+    else:
+        data = rom[offset:]
+    tile_size = codec.getTileSize()
+    if "count" in job:
+        data = data[:job["count"] * tile_size]
+    else:
+        data = data[:len(data) // tile_size * tile_size]
+
+    output = job["output"]
+    if isinstance(codec, DirectColorCodec):
+        img, raw = decode_direct_image(data, codec, job.get("width", 16))
+        if output.lower().endswith(".png"):
+            img.save(output, "PNG")
+        else:
+            with open(output, "wb") as f:
+                f.write(raw)
+        return output, time.perf_counter() - start_time
+
+    img = gba.decode_index_image(data, codec, job.get("width", 16))
+    if output.lower().endswith(".png"):
+        palette = load_palette(job.get("palette"), job["rom"],
+            codec.getColorCount())
+        gba.apply_palette(img, palette).save(output, "PNG")
+    else:
+        with open(output, "wb") as f:
+            f.write(img.tobytes())
+
+    return output, time.perf_counter() - start_time
+
+def load_manifest(path):
+    """
+    Reads the job list from a manifest file
+    """
+    with open(path) as f:
+        manifest = json.load(f)
+    if isinstance(manifest, dict):
+        manifest = manifest["jobs"]
+    # jobs on the same ROM run next to each other
+    return sorted(manifest, key=lambda job: job["rom"])
+
+def run_jobs(jobs, workers=None, quiet=False):
+    """
+    Runs jobs in a process pool and prints the progress to stderr. Returns
+    the number of failed jobs.
+    """
+    failed = 0
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        futures = {pool.submit(run_job, job): job for job in jobs}
+        done = concurrent.futures.as_completed(futures)
+        for i, future in enumerate(done, 1):
+            job = futures[future]
+            try:
+                output, seconds = future.result()
+            except Exception as e:
+                failed += 1
+                print("[{}/{}] {} failed: {}".format(i, len(jobs),
+                    job.get("output"), e), file=sys.stderr)
+                continue
+            if not quiet:
+                print("[{}/{}] {} {:.1f} ms".format(i, len(jobs), output,
+                    seconds * 1000), file=sys.stderr)
+    return failed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="tilecodecs",
+        description="Extract tile graphics from ROMs using a job manifest")
+    parser.add_argument("manifest", help="JSON job manifest")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+        help="number of worker processes, defaults to the CPU count")
+    parser.add_argument("-q", "--quiet", action="store_true",
+        help="only report failed jobs")
+    args = parser.parse_args(argv)
+
+    jobs = load_manifest(args.manifest)
+    start_time = time.perf_counter()
+    failed = run_jobs(jobs, args.jobs, args.quiet)
+    print("{} jobs, {} failed, {:.2f} s".format(len(jobs), failed,
+        time.perf_counter() - start_time), file=sys.stderr)
+    return 1 if failed else 0
@@ -1,11 +1,17 @@
 from PIL import Image
+from tilecodecs.TileCodec import view_bits
 import struct
 import math
+import concurrent.futures
+import array
+import sys
 
 # Palette functions
 
 PALETTE_FMT = "<16H"
 PALETTE_SIZE = struct.calcsize(PALETTE_FMT)
+# Palette RAM holds 16 background palettes followed by 16 object palettes
+BG_PALETTE_RAM_SIZE = PALETTE_SIZE * 16
 
 def decode_color(color, alpha=False):
     """
@@ -69,12 +75,23 @@ def iter_decode_palettes(data, alpha=False):
     """
     Decodes multiple palettes
     """
+    data = view_bits(data)
     if len(data) % PALETTE_SIZE != 0:
         raise ValueError("Data length has to be a multiple of PALETTE_SIZE")
 
     for i in range(0, len(data), PALETTE_SIZE):
         yield decode_palette(data[i:i+PALETTE_SIZE], alpha)
 
+def view_palette_data(palettes):
+    """
+    Returns a byte view if palettes is encoded palette data, for example a
+    palette RAM dump, or None if it is a list of colors
+    """
+    try:
+        return view_bits(palettes)
+    except TypeError:
+        return None
+
 def iter_encode_palettes(palettes):
     """
     Encodes multiple palettes into a single bytearray.
@@ -87,20 +104,76 @@ def iter_encode_palettes(palettes):
 
 # Tile functions
 
-def iter_decode_tiles(codec, data):
+def iter_decode_tiles(codec, data, ofs=0, count=None):
     """
-    Decodes multiple tiles from a bytes-like object
+    Decodes multiple tiles from a bytes-like object. The data is not copied,
+    so large buffers like a memory mapped ROM can be passed directly.
+
+    Arguments:
+    codec - TileCodec instance
+    data - A bytes-like object of encoded tile data
+    ofs - Offset of the first tile in data
+    count - Number of tiles to decode, defaults to all remaining tiles
     """
-    for i in range(0, len(data), codec.getTileSize()):
+    data = view_bits(data)
+    tile_size = codec.getTileSize()
+    if count is None:
+        count = -(-(len(data) - ofs) // tile_size)
+    for i in range(ofs, ofs + count*tile_size, tile_size):
         yield codec.decode(data, i)
 
-def iter_encode_tiles(codec, tiles):
+def decode_tiles_threaded(codec, data, ofs=0, count=None, executor=None,
+        chunk_size=1024):
     """
-    Encodes multiple tiles into a new bytearray
+    Decodes multiple tiles on a thread pool. Codecs are immutable, so the
+    same instance is shared by all threads. Each task decodes chunk_size
+    tiles. Returns a list of tiles in data order.
+
+    Arguments:
+    codec - TileCodec instance
+    data - A bytes-like object of encoded tile data
+    ofs - Offset of the first tile in data
+    count - Number of tiles to decode, defaults to all remaining tiles
+    executor - concurrent.futures.Executor to use, a temporary
+               ThreadPoolExecutor is created if none is given
+    chunk_size - Number of tiles per task
     """
-    data = bytearray()
-    for tile in tiles:
-        data += codec.encode(tile)
+    data = view_bits(data)
+    tile_size = codec.getTileSize()
+    if count is None:
+        count = -(-(len(data) - ofs) // tile_size)
+
+    def decode_chunk(first):
+        chunk_count = min(chunk_size, count - first)
+        return list(iter_decode_tiles(codec, data, ofs + first*tile_size,
+            chunk_count))
+
+    starts = range(0, count, chunk_size)
+    if executor is None:
+        with concurrent.futures.ThreadPoolExecutor() as pool:
+            chunks = list(pool.map(decode_chunk, starts))
+    else:
+        chunks = list(executor.map(decode_chunk, starts))
+
+    tiles = []
+    for chunk in chunks:
+        tiles += chunk
+    return tiles
+
+def iter_encode_tiles(codec, tiles, data=None, ofs=0):
+    """
+    Encodes multiple tiles into a new bytearray. If data is given, the tiles
+    are written into it starting at ofs and a memoryview onto it is returned.
+    """
+    if data is None:
+        data = bytearray()
+        for tile in tiles:
+            data += codec.encode(tile)
+        return data
+
+    data = view_bits(data, writable=True)
+    for i, tile in enumerate(tiles):
+        codec.encode(tile, data, ofs + i*codec.getTileSize(), copy=False)
     return data
 
 def color_tile(tile, palette):
@@ -159,6 +232,85 @@ def decode_image(data, codec, palette, width):
     img = combine_tiles(tuple(img_tiles), width)
     return img
 
+def decode_index_image(data, codec, width):
+    """
+    Decodes the tiles into a single "P" mode image holding the raw palette
+    indices. The width is meassured in tiles, the height is calculated
+    automatically. Colors can be applied afterwards with apply_palette.
+    """
+    if codec.getBitsPerPixel() > 8:
+        raise ValueError("Index images need a codec with at most 8bpp")
+
+    return tiles_index_image(tuple(iter_decode_tiles(codec, data)), width)
+
+def tiles_index_image(tiles, width):
+    """
+    Combines already decoded tiles, for example a TileSet, into a "P" mode
+    image like decode_index_image.
+    """
+    height = int(math.ceil(len(tiles) / width))
+    img_width = width * 8
+    plane = bytearray(img_width * height * 8)
+    for tile_i, tile in enumerate(tiles):
+        pos = (tile_i // width) * 8 * img_width + (tile_i % width) * 8
+        for row in range(0, 64, 8):
+            plane[pos:pos+8] = tile[row:row+8]
+            pos += img_width
+
+    img = Image.frombytes("P", (img_width, height*8), bytes(plane))
+    img.info["tile_count"] = len(tiles)
+    return img
+
+def apply_palette(index_img, palette):
+    """
+    Colors an index image from decode_index_image with the given palette.
+    Only the palette lookup table is replaced, the pixels are not decoded
+    again. Like in decode_image, the space after the last tile stays
+    transparent. The tile count is read from index_img.info["tile_count"].
+    """
+    if len(palette[0]) == 4:
+        rawmode = "RGBA"
+    else:
+        rawmode = "RGB"
+    pal_data = bytearray()
+    for color in palette:
+        pal_data += bytes(color)
+
+    img = index_img.copy()
+    img.putpalette(pal_data, rawmode)
+    img = img.convert("RGBA")
+
+    count = index_img.info.get("tile_count")
+    tiles_w = img.width // 8
+    if count is not None and count % tiles_w:
+        x = (count % tiles_w) * 8
+        img.paste((0, 0, 0, 0), (x, img.height - 8, img.width, img.height))
+    return img
+
+def iter_palette_images(index_img, palettes):
+    """
+    Colors an index image with each palette. palettes can also be encoded
+    palette data, for example a palette RAM dump.
+    """
+    data = view_palette_data(palettes)
+    if data is not None:
+        palettes = iter_decode_palettes(data)
+    for palette in palettes:
+        yield apply_palette(index_img, palette)
+
+def decode_palette_sheet(data, codec, palettes, width):
+    """
+    Decodes the tiles once and renders them with every palette. The
+    variants are stacked vertically in palette order.
+    """
+    index_img = decode_index_image(data, codec, width)
+    images = tuple(iter_palette_images(index_img, palettes))
+    sheet = Image.new("RGBA", (index_img.width,
+        index_img.height * len(images)))
+    for i, img in enumerate(images):
+        sheet.paste(img, (0, i * index_img.height))
+    return sheet
+
 def decode_tilemap(tilemap, tiles, palettes):
     """
     Creates a list of colored tiles from a tilemap, raw tiles and a
@@ -185,3 +337,184 @@ def decode_tilemap(tilemap, tiles, palettes):
         tilemap_tiles.append(tile_img)
 
     return tilemap_tiles
+
+
+# Affine background functions
+# Layout: Section 12 at http://www.coranac.com/tonc/text/affbg.htm
+
+SCREEN_SIZE = (240, 160)
+AFFINE_MAP_SIZES = (16, 32, 64, 128)
+
+def affine_bg_texture(tilemap, tiles):
+    """
+    Builds the full index plane of an affine background. Affine tilemaps
+    use one byte per entry, no flips and no palette banks. Returns the
+    plane as a bytearray and its width in pixels.
+
+    Arguments:
+    tilemap - A bytes-like object of 16x16 to 128x128 map entries
+    tiles - 8bpp tiles, for example a TileSet decoded with LinearCodec(8)
+    """
+    tilemap = view_bits(tilemap)
+    map_width = math.isqrt(len(tilemap))
+    if map_width not in AFFINE_MAP_SIZES or map_width**2 != len(tilemap):
+        raise ValueError("Affine tilemaps have to be 16, 32, 64 or 128 "
+            "tiles square, got {} entries".format(len(tilemap)))
+
+    width = map_width * 8
+    texture = bytearray(width * width)
+    for i, tile_id in enumerate(tilemap):
+        tile = tiles[tile_id]
+        pos = (i // map_width) * 8 * width + (i % map_width) * 8
+        for row in range(0, 64, 8):
+            texture[pos:pos+8] = tile[row:row+8]
+            pos += width
+    return texture, width
+
+def iter_affine_bg_lines(texture, tex_width, pa, pb, pc, pd, x_ref, y_ref,
+        wrap=False, size=SCREEN_SIZE):
+    """
+    Renders an affine background texture scanline by scanline. Yields one
+    bytearray of palette indices per line, 0 is transparent. Like the
+    hardware, the reference point is advanced by (pb, pd) every line and
+    the texture coordinate by (pa, pc) every pixel, no matrix product is
+    computed per pixel.
+
+    Arguments:
+    texture, tex_width - Index plane from affine_bg_texture
+    pa, pb, pc, pd - Signed 8.8 fixed point matrix (BGxPA-BGxPD)
+    x_ref, y_ref - Signed 20.8 fixed point reference point (BGxX, BGxY)
+    wrap - Wraparound flag (bit 13 of BGxCNT)
+    size - Output size in pixels
+    """
+    width, height = size
+    mask = tex_width - 1
+    line_x = x_ref
+    line_y = y_ref
+    for _ in range(height):
+        line = bytearray(width)
+        tx = line_x
+        ty = line_y
+        for x in range(width):
+            u = tx >> 8
+            v = ty >> 8
+            if wrap:
+                line[x] = texture[((v & mask) * tex_width) + (u & mask)]
+            elif 0 <= u < tex_width and 0 <= v < tex_width:
+                line[x] = texture[v * tex_width + u]
+            tx += pa
+            ty += pc
+        yield line
+        line_x += pb
+        line_y += pd
+
+def render_affine_bg(tilemap, tiles, palette, pa, pb, pc, pd, x_ref, y_ref,
+        wrap=False, size=SCREEN_SIZE):
+    """
+    Renders an affine background of video mode 1 or 2 into an RGBA image.
+    Index 0 is transparent. See iter_affine_bg_lines for the arguments,
+    palette is a list of 256 rgb(a) tuples.
+    """
+    texture, tex_width = affine_bg_texture(tilemap, tiles)
+    plane = bytearray()
+    for line in iter_affine_bg_lines(texture, tex_width, pa, pb, pc, pd,
+            x_ref, y_ref, wrap, size):
+        plane += line
+
+    colors = [(0, 0, 0, 0)] + [tuple(c[:3]) + (255,) for c in palette[1:]]
+    return apply_palette(Image.frombytes("P", size, bytes(plane)), colors)
+
+
+# Bitmap mode functions
+# Layout: Section 5 at http://www.coranac.com/tonc/text/bitmaps.htm
+
+MODE3_SIZE = SCREEN_SIZE
+MODE4_SIZE = SCREEN_SIZE
+MODE5_SIZE = (160, 128)
+BITMAP_PAGE_OFFSET = 0xA000
+
+_direct_color_table = None
+
+def direct_color_table():
+    """
+    Returns an array with the RGBA value of every 16bit color as a native
+    32bit int, ready to be written out with tobytes(). The table is built
+    on first use and matches decode_color.
+    """
+    global _direct_color_table
+    if _direct_color_table is None:
+        table = array.array("I", bytes(4 * 0x10000))
+        for color in range(0x8000):
+            r, g, b = decode_color(color)
+            table[color] = r | (g << 8) | (b << 16) | (0xFF << 24)
+        if sys.byteorder == "big":
+            table.byteswap()
+        # bit 15 is unused
+        table[0x8000:] = table[:0x8000]
+        _direct_color_table = table
+    return _direct_color_table
+
+def decode_direct_bitmap(data, size):
+    """
+    Converts a frame of 16bit colors into an RGBA image in one pass
+    """
+    width, height = size
+    colors = array.array("H")
+    colors.frombytes(view_bits(data)[:width*height*2])
+    if sys.byteorder == "big":
+        colors.byteswap()
+    table = direct_color_table()
+    rgba = array.array("I", map(table.__getitem__, colors))
+    return Image.frombuffer("RGBA", size, rgba.tobytes(), "raw", "RGBA", 0, 1)
+
+def decode_bitmap_mode3(vram):
+    """
+    Decodes the 240x160 16bit frame of bitmap mode 3
+    """
+    return decode_direct_bitmap(vram, MODE3_SIZE)
+
+def decode_bitmap_mode4(vram, palette, page=0):
+    """
+    Decodes a 240x160 paletted frame of bitmap mode 4.
+
+    Arguments:
+    vram - A bytes-like object of VRAM, starting at 0x06000000
+    palette - 256 rgb(a) tuples or encoded palette RAM, only the background
+              half is used
+    page - Frame page, 0 or 1
+    """
+    data = view_palette_data(palette)
+    if data is not None:
+        palette = []
+        for pal in iter_decode_palettes(data[:BG_PALETTE_RAM_SIZE]):
+            palette += pal
+    palette = palette[:256]
+    width, height = MODE4_SIZE
+    start = page * BITMAP_PAGE_OFFSET
+    indices = bytes(view_bits(vram)[start:start + width*height])
+    return apply_palette(Image.frombytes("P", MODE4_SIZE, indices), palette)
+
+def decode_bitmap_mode5(vram, page=0):
+    """
+    Decodes a 160x128 16bit frame of bitmap mode 5
+    """
+    start = page * BITMAP_PAGE_OFFSET
+    return decode_direct_bitmap(view_bits(vram)[start:], MODE5_SIZE)
+
+def decode_bitmap(vram, mode, page=0, palette=None):
+    """
+    Decodes a frame of bitmap mode 3, 4 or 5. Mode 3 has only one page,
+    mode 4 needs a palette.
+    """
+    if page not in (0, 1) or (mode == 3 and page != 0):
+        raise ValueError("Invalid page {} for mode {}".format(page, mode))
+    if mode == 3:
+        return decode_bitmap_mode3(vram)
+    elif mode == 4:
+        if palette is None:
+            raise ValueError("Mode 4 needs a palette")
+        return decode_bitmap_mode4(vram, palette, page)
+    elif mode == 5:
+        return decode_bitmap_mode5(vram, page)
+    else:
+        raise ValueError("Not a bitmap mode: {}".format(mode))
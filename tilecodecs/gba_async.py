@@ -0,0 +1,205 @@
+from tilecodecs.TileCodec import view_bits
+from tilecodecs.DecodeCache import codec_key
+from tilecodecs import gba
+import asyncio
+import concurrent.futures
+import hashlib
+
+# Inputs up to this size are hashed on the event loop, larger ones on the
+# executor
+HASH_INLINE_SIZE = 4096
+
+class AsyncDecoder(object):
+    """
+    Runs decode functions from an asyncio event loop without blocking it.
+    The work is done on a bounded thread pool. Identical requests that are
+    running at the same time are only decoded once and all callers get the
+    same result object, so results must not be modified. When max_pending
+    jobs are queued or running, new requests wait until a slot frees up.
+
+    Requests are identified by a hash of their input bytes. Callers that
+    already have a cheap identity for the data, like a ROM name, offset and
+    length, can pass it as data_key to skip hashing.
+    """
+
+    def __init__(self, max_workers=None, max_pending=16, executor=None):
+        """
+        Creates a decoder
+
+        Arguments:
+        max_workers - Number of threads of the internal executor
+        max_pending - Maximum number of jobs queued or running at once
+        executor - ThreadPoolExecutor to use instead of the internal one.
+                   Process pools don't work, jobs pass memoryviews.
+        """
+        if executor is None:
+            executor = concurrent.futures.ThreadPoolExecutor(max_workers)
+            self.owns_executor = True
+        else:
+            self.owns_executor = False
+        self.executor = executor
+        self.max_pending = max_pending
+        self.slots = asyncio.Semaphore(max_pending)
+        # {request key: asyncio.Task}
+        self.in_flight = {}
+
+    def make_key(self, func, data, *params, data_key=None):
+        """
+        Hashes the function, the input bytes (or data_key instead) and all
+        parameters that influence the result
+        """
+        if data_key is None:
+            digest = hashlib.sha256(view_bits(data))
+        else:
+            digest = hashlib.sha256(b"\x01" + repr(data_key).encode())
+        digest.update(func.__qualname__.encode())
+        for param in params:
+            if hasattr(param, "getParameters"):
+                param = codec_key(param)
+            digest.update(b"\x00" + repr(param).encode())
+        return digest.digest()
+
+    async def get_key(self, func, data, *params, data_key=None):
+        """
+        Calls make_key, large inputs are hashed on the executor. Hashing
+        takes a job slot, so it's limited by max_pending as well.
+        """
+        if data_key is not None or len(view_bits(data)) <= HASH_INLINE_SIZE:
+            return self.make_key(func, data, *params, data_key=data_key)
+        async with self.slots:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, self.make_key,
+                func, data, *params)
+
+    async def run(self, key, func, *args):
+        """
+        Runs func(*args) on the executor, or waits for an identical job that
+        is already running
+        """
+        task = self.in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._run_job(key, func, args))
+            self.in_flight[key] = task
+        # Shielded, so a cancelled caller doesn't cancel the shared job
+        return await asyncio.shield(task)
+
+    async def _run_job(self, key, func, args):
+        try:
+            async with self.slots:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(self.executor, func, *args)
+        finally:
+            del self.in_flight[key]
+
+    async def decode_image(self, data, codec, palette, width, data_key=None):
+        """
+        Async version of gba.decode_image
+        """
+        key = await self.get_key(gba.decode_image, data, codec, palette,
+            width, data_key=data_key)
+        return await self.run(key, gba.decode_image, data, codec, palette,
+            width)
+
+    async def decode_index_image(self, data, codec, width, data_key=None):
+        """
+        Async version of gba.decode_index_image
+        """
+        key = await self.get_key(gba.decode_index_image, data, codec, width,
+            data_key=data_key)
+        return await self.run(key, gba.decode_index_image, data, codec,
+            width)
+
+    async def decode_tiles(self, codec, data, ofs=0, count=None,
+            batch_size=1024, data_key=None):
+        """
+        Decodes tiles in batches of batch_size tiles and yields a list of
+        tiles for each batch. The next batch is decoded while the current
+        one is being processed.
+
+        Arguments:
+        codec - TileCodec instance
+        data - A bytes-like object of encoded tile data
+        ofs - Offset of the first tile in data
+        count - Number of tiles to decode, defaults to all remaining tiles
+        batch_size - Number of tiles per batch
+        data_key - Optional identity of data, used instead of hashing it
+        """
+        data = view_bits(data)
+        tile_size = codec.getTileSize()
+        if count is None:
+            count = -(-(len(data) - ofs) // tile_size)
+
+        async def decode_batch(first):
+            batch_count = min(batch_size, count - first)
+            batch_ofs = ofs + first*tile_size
+            batch_data = data[batch_ofs:batch_ofs + batch_count*tile_size]
+            batch_key = None
+            if data_key is not None:
+                batch_key = (data_key, batch_ofs)
+            key = await self.get_key(gba.iter_decode_tiles, batch_data, codec,
+                batch_count, data_key=batch_key)
+            return await self.run(key, list,
+                gba.iter_decode_tiles(codec, batch_data, 0, batch_count))
+
+        pending = None
+        try:
+            for first in range(0, count, batch_size):
+                if pending is None:
+                    pending = asyncio.ensure_future(decode_batch(first))
+                batch = await pending
+                pending = None
+                if first + batch_size < count:
+                    pending = asyncio.ensure_future(
+                        decode_batch(first + batch_size))
+                yield batch
+        finally:
+            if pending is not None:
+                pending.cancel()
+
+    def close(self):
+        """
+        Shuts down the internal executor
+        """
+        if self.owns_executor:
+            self.executor.shutdown(wait=False)
+
+_default_decoder = None
+_default_loop = None
+
+def get_default_decoder():
+    """
+    Returns the shared AsyncDecoder used by the module level functions. A
+    new one is created when the running event loop changes.
+    """
+    global _default_decoder, _default_loop
+    loop = asyncio.get_running_loop()
+    if _default_decoder is None or _default_loop is not loop:
+        if _default_decoder is not None:
+            _default_decoder.close()
+        _default_decoder = AsyncDecoder()
+        _default_loop = loop
+    return _default_decoder
+
+async def adecode_image(data, codec, palette, width, data_key=None):
+    """
+    Decodes a complete image without blocking the event loop. See
+    gba.decode_image.
+    """
+    return await get_default_decoder().decode_image(data, codec, palette,
+        width, data_key)
+
+async def adecode_index_image(data, codec, width, data_key=None):
+    """
+    Decodes a "P" mode index image without blocking the event loop. See
+    gba.decode_index_image.
+    """
+    return await get_default_decoder().decode_index_image(data, codec, width,
+        data_key)
+
+def adecode_tiles(codec, data, ofs=0, count=None, batch_size=1024,
+        data_key=None):
+    """
+    Async iterator over batches of decoded tiles, use with async for
+    """
+    return get_default_decoder().decode_tiles(codec, data, ofs, count,
+        batch_size, data_key)
@@ -0,0 +1,488 @@
+from tilecodecs.TileCodec import view_bits
+import struct
+import heapq
+
+"""
+Compression formats supported by the GBA BIOS decompression functions.
+Layout: http://problemkaputt.de/gbatek.htm#biosdecompressionfunctions
+
+Every format starts with a 32bit header. Bits 4-7 contain the compression
+type, bits 0-3 a type specific parameter and bits 8-31 the decompressed size.
+"""
+
+TYPE_LZ77 = 1
+TYPE_HUFFMAN = 2
+TYPE_RLE = 3
+TYPE_DIFF = 8
+
+HEADER_FMT = "<I"
+HEADER_SIZE = struct.calcsize(HEADER_FMT)
+
+LZ77_MIN_LENGTH = 3
+LZ77_MAX_LENGTH = 18
+LZ77_WINDOW = 4096
+
+RLE_MIN_RUN = 3
+RLE_MAX_RUN = 130
+RLE_MAX_RAW = 128
+
+HUFFMAN_MAX_OFFSET = 63
+
+# Header functions
+
+def decode_header(data, ofs=0):
+    """
+    Reads a compression header. Returns (type, parameter, size).
+    """
+    header, = struct.unpack_from(HEADER_FMT, data, ofs)
+    return ((header >> 4) & 0xF, header & 0xF, header >> 8)
+
+def encode_header(comp_type, param, size):
+    """
+    Creates a compression header
+    """
+    if size >= (1 << 24):
+        raise ValueError("Decompressed size has to be smaller than 16MB")
+    return struct.pack(HEADER_FMT, (size << 8) | (comp_type << 4) | param)
+
+def check_header(data, ofs, comp_type):
+    """
+    Reads a header and raises a ValueError if it is not of the given type.
+    Returns (parameter, size).
+    """
+    found_type, param, size = decode_header(data, ofs)
+    if found_type != comp_type:
+        raise ValueError("Wrong compression type. Expected {}, got {}"
+            .format(comp_type, found_type))
+    return param, size
+
+
+# LZ77 functions
+
+def decompress_lz77(data, ofs=0):
+    """
+    Decompresses LZ77 data into a new bytearray.
+
+    Arguments:
+    data - A bytes-like object of compressed data
+    ofs - Offset of the header in data
+    """
+    data = view_bits(data)
+    _, size = check_header(data, ofs, TYPE_LZ77)
+    out = bytearray()
+    pos = ofs + HEADER_SIZE
+
+    while len(out) < size:
+        flags = data[pos]
+        pos += 1
+        for bit in range(7, -1, -1):
+            if len(out) >= size:
+                break
+            if not flags & (1 << bit):
+                out.append(data[pos])
+                pos += 1
+                continue
+
+            length = (data[pos] >> 4) + LZ77_MIN_LENGTH
+            disp = (((data[pos] & 0xF) << 8) | data[pos+1]) + 1
+            pos += 2
+            start = len(out) - disp
+            if start < 0:
+                raise ValueError("LZ77 back reference before start of data")
+            if disp >= length:
+                out += out[start:start+length]
+            else:
+                # overlapping reference, repeat the last disp bytes
+                pattern = out[start:]
+                out += (pattern * (length // disp + 1))[:length]
+
+    del out[size:]
+    return out
+
+def compress_lz77(data, vram_safe=False, max_chain=128):
+    """
+    Compresses data with LZ77. Matches are found through hash chains over
+    all 3 byte prefixes in the window.
+
+    Arguments:
+    data - A bytes-like object
+    vram_safe - Avoid back references with a displacement of 1, which
+                LZ77UnCompVram can't handle
+    max_chain - Maximum number of earlier positions tried per match
+    """
+    data = bytes(view_bits(data))
+    size = len(data)
+    min_disp = 2 if vram_safe else 1
+    out = bytearray(encode_header(TYPE_LZ77, 0, size))
+
+    head = {}
+    prev = [-1] * size
+    def insert(i):
+        if i + LZ77_MIN_LENGTH <= size:
+            key = data[i:i+LZ77_MIN_LENGTH]
+            prev[i] = head.get(key, -1)
+            head[key] = i
+
+    pos = 0
+    while pos < size:
+        flags_pos = len(out)
+        out.append(0)
+        for bit in range(7, -1, -1):
+            if pos >= size:
+                break
+
+            best_len = 0
+            best_disp = 0
+            max_len = min(LZ77_MAX_LENGTH, size - pos)
+            if max_len >= LZ77_MIN_LENGTH:
+                cand = head.get(data[pos:pos+LZ77_MIN_LENGTH], -1)
+                chain = max_chain
+                while cand >= 0 and pos - cand <= LZ77_WINDOW and chain > 0:
+                    chain -= 1
+                    if pos - cand >= min_disp:
+                        length = LZ77_MIN_LENGTH
+                        while (length < max_len and
+                                data[cand+length] == data[pos+length]):
+                            length += 1
+                        if length > best_len:
+                            best_len = length
+                            best_disp = pos - cand
+                            if length == max_len:
+                                break
+                    cand = prev[cand]
+
+            if best_len >= LZ77_MIN_LENGTH:
+                out[flags_pos] |= 1 << bit
+                disp = best_disp - 1
+                out.append(((best_len - LZ77_MIN_LENGTH) << 4) | (disp >> 8))
+                out.append(disp & 0xFF)
+                for i in range(pos, pos + best_len):
+                    insert(i)
+                pos += best_len
+            else:
+                out.append(data[pos])
+                insert(pos)
+                pos += 1
+
+    pad_to_word(out)
+    return out
+
+
+# RLE functions
+
+def decompress_rle(data, ofs=0):
+    """
+    Decompresses run length encoded data into a new bytearray.
+    """
+    data = view_bits(data)
+    _, size = check_header(data, ofs, TYPE_RLE)
+    out = bytearray()
+    pos = ofs + HEADER_SIZE
+
+    while len(out) < size:
+        flag = data[pos]
+        pos += 1
+        if flag & 0x80:
+            out += bytes((data[pos],)) * ((flag & 0x7F) + RLE_MIN_RUN)
+            pos += 1
+        else:
+            length = (flag & 0x7F) + 1
+            out += data[pos:pos+length]
+            pos += length
+
+    del out[size:]
+    return out
+
+def compress_rle(data):
+    """
+    Compresses data with run length encoding
+    """
+    data = bytes(view_bits(data))
+    size = len(data)
+    out = bytearray(encode_header(TYPE_RLE, 0, size))
+
+    raw_start = 0
+    pos = 0
+    while pos < size:
+        run = 1
+        while (pos + run < size and run < RLE_MAX_RUN and
+                data[pos+run] == data[pos]):
+            run += 1
+
+        if run < RLE_MIN_RUN:
+            pos += run
+            continue
+
+        write_rle_raw(out, data, raw_start, pos)
+        out.append(0x80 | (run - RLE_MIN_RUN))
+        out.append(data[pos])
+        pos += run
+        raw_start = pos
+
+    write_rle_raw(out, data, raw_start, size)
+    pad_to_word(out)
+    return out
+
+def write_rle_raw(out, data, start, end):
+    """
+    Writes data[start:end] as uncompressed RLE blocks
+    """
+    for i in range(start, end, RLE_MAX_RAW):
+        block = data[i:min(i + RLE_MAX_RAW, end)]
+        out.append(len(block) - 1)
+        out += block
+
+
+# Huffman functions
+
+def decompress_huffman(data, ofs=0):
+    """
+    Decompresses 4 or 8 bit Huffman data into a new bytearray.
+    """
+    data = view_bits(data)
+    bits, size = check_header(data, ofs, TYPE_HUFFMAN)
+    if bits not in (4, 8):
+        raise ValueError("Huffman data size has to be 4 or 8 bits, got {}"
+            .format(bits))
+
+    tree = ofs + HEADER_SIZE
+    root = tree + 1
+    stream = tree + (data[tree] + 1) * 2
+    unit_count = size * 8 // bits
+
+    units = []
+    node = root
+    pos = stream
+    while len(units) < unit_count:
+        word, = struct.unpack_from("<I", data, pos)
+        pos += 4
+        for bit in range(31, -1, -1):
+            direction = (word >> bit) & 1
+            value = data[node]
+            # Child offsets are relative to the aligned node pair, counted
+            # from the tree start so any ofs works
+            child = (tree + ((node - tree) & ~1) + (value & 0x3F) * 2 + 2
+                + direction)
+            if value & (0x80 >> direction):
+                units.append(data[child])
+                if len(units) >= unit_count:
+                    break
+                node = root
+            else:
+                node = child
+
+    if bits == 8:
+        return bytearray(units)
+    return bytearray(units[i] | (units[i+1] << 4)
+        for i in range(0, unit_count, 2))
+
+def compress_huffman(data, bits=8):
+    """
+    Compresses data with a 4 or 8 bit Huffman code.
+    """
+    if bits not in (4, 8):
+        raise ValueError("Huffman data size has to be 4 or 8 bits, got {}"
+            .format(bits))
+    data = bytes(view_bits(data))
+    if bits == 8:
+        units = data
+    else:
+        units = []
+        for byte in data:
+            units.append(byte & 0xF)
+            units.append(byte >> 4)
+
+    root = build_huffman_tree(units)
+    table = layout_huffman_tree(root)
+    codes = {}
+    collect_huffman_codes(root, 0, 0, codes)
+
+    out = bytearray(encode_header(TYPE_HUFFMAN, bits, len(data)))
+    out += table
+
+    acc = 0
+    acc_bits = 0
+    for unit in units:
+        code, length = codes[unit]
+        acc = (acc << length) | code
+        acc_bits += length
+        while acc_bits >= 32:
+            acc_bits -= 32
+            out += struct.pack("<I", (acc >> acc_bits) & 0xFFFFFFFF)
+            acc &= (1 << acc_bits) - 1
+    if acc_bits:
+        out += struct.pack("<I", acc << (32 - acc_bits))
+    return out
+
+def build_huffman_tree(units):
+    """
+    Builds a Huffman tree from a sequence of values. Leaves are ints,
+    inner nodes are (child0, child1) tuples.
+    """
+    counts = {}
+    for unit in units:
+        counts[unit] = counts.get(unit, 0) + 1
+    if not counts:
+        counts[0] = 1
+
+    heap = [(count, i, unit) for i, (unit, count) in
+        enumerate(sorted(counts.items()))]
+    heapq.heapify(heap)
+    if len(heap) == 1:
+        # the tree needs at least one pair of leaves
+        unit = heap[0][2]
+        return (unit, unit)
+
+    serial = len(heap)
+    while len(heap) > 1:
+        count0, _, node0 = heapq.heappop(heap)
+        count1, _, node1 = heapq.heappop(heap)
+        heapq.heappush(heap, (count0 + count1, serial, (node0, node1)))
+        serial += 1
+    return heap[0][2]
+
+def collect_huffman_codes(node, code, length, codes):
+    """
+    Stores (code, length) for every leaf of the tree in codes
+    """
+    if not isinstance(node, tuple):
+        codes[node] = (code, max(length, 1))
+        return
+    collect_huffman_codes(node[0], code << 1, length + 1, codes)
+    if node[0] != node[1] or isinstance(node[0], tuple):
+        collect_huffman_codes(node[1], (code << 1) | 1, length + 1, codes)
+
+def layout_huffman_tree(root):
+    """
+    Serializes a Huffman tree into the BIOS tree table, including the size
+    byte. Child pairs can only be placed up to 63 pairs after their parent,
+    so pairs are laid out depth first unless a pending parent is about to
+    run out of range.
+    """
+    # slot 0 holds the size byte and the root node, every further slot
+    # holds a pair of child nodes
+    table = bytearray(2)
+    pending = [(HUFFMAN_MAX_OFFSET + 1, 1, root)]
+    slot = 1
+
+    while pending:
+        deadlines = sorted(p[0] for p in pending)
+        urgent = any(d - slot < i + 1 for i, d in enumerate(deadlines))
+        if urgent:
+            index = min(range(len(pending)), key=lambda i: pending[i][0])
+        else:
+            index = len(pending) - 1
+        deadline, parent_addr, node = pending.pop(index)
+        if slot > deadline:
+            raise ValueError("Huffman tree too unbalanced to be encoded")
+
+        parent_slot = parent_addr // 2
+        flags = slot - parent_slot - 1
+        addr = len(table)
+        table += b"\x00\x00"
+        for direction, child in enumerate(node):
+            if isinstance(child, tuple):
+                pending.append((slot + HUFFMAN_MAX_OFFSET + 1,
+                    addr + direction, child))
+            else:
+                flags |= 0x80 >> direction
+                table[addr + direction] = child
+        table[parent_addr] = flags
+        slot += 1
+
+    # the bitstream has to start word aligned
+    while (len(table) + HEADER_SIZE) % 4 != 0:
+        table.append(0)
+    table[0] = len(table) // 2 - 1
+    return table
+
+
+# Diff filter functions
+
+def decompress_diff(data, ofs=0):
+    """
+    Reverses an 8 or 16 bit difference filter into a new bytearray
+    """
+    data = view_bits(data)
+    unit_size, size = check_header(data, ofs, TYPE_DIFF)
+    pos = ofs + HEADER_SIZE
+    out = bytearray(data[pos:pos+size])
+
+    if unit_size == 1:
+        acc = 0
+        for i in range(size):
+            acc = (acc + out[i]) & 0xFF
+            out[i] = acc
+    elif unit_size == 2:
+        acc = 0
+        for i in range(0, size - 1, 2):
+            acc = (acc + out[i] + (out[i+1] << 8)) & 0xFFFF
+            out[i] = acc & 0xFF
+            out[i+1] = acc >> 8
+    else:
+        raise ValueError("Diff unit size has to be 1 or 2, got {}"
+            .format(unit_size))
+    return out
+
+def compress_diff(data, unit_size=1):
+    """
+    Applies an 8 (unit_size 1) or 16 (unit_size 2) bit difference filter
+    """
+    data = view_bits(data)
+    size = len(data)
+    out = bytearray(encode_header(TYPE_DIFF, unit_size, size))
+
+    if unit_size == 1:
+        last = 0
+        for value in data:
+            out.append((value - last) & 0xFF)
+            last = value
+    elif unit_size == 2:
+        if size % 2 != 0:
+            raise ValueError("16 bit diff data needs an even length")
+        last = 0
+        for i in range(0, size, 2):
+            value = data[i] | (data[i+1] << 8)
+            out += struct.pack("<H", (value - last) & 0xFFFF)
+            last = value
+    else:
+        raise ValueError("Diff unit size has to be 1 or 2, got {}"
+            .format(unit_size))
+
+    pad_to_word(out)
+    return out
+
+
+# Generic functions
+
+DECOMPRESSORS = {
+    TYPE_LZ77: decompress_lz77,
+    TYPE_HUFFMAN: decompress_huffman,
+    TYPE_RLE: decompress_rle,
+    TYPE_DIFF: decompress_diff,
+}
+
+def pad_to_word(out):
+    """
+    Pads compressed data to a multiple of 4 bytes
+    """
+    out += b"\x00" * (-len(out) % 4)
+
+def decompress(data, ofs=0):
+    """
+    Decompresses data of any supported type, detected from the header
+    """
+    comp_type, _, _ = decode_header(data, ofs)
+    if comp_type not in DECOMPRESSORS:
+        raise ValueError("Unknown compression type {}".format(comp_type))
+    return DECOMPRESSORS[comp_type](data, ofs)
+
+def iter_decompress_tiles(codec, data, ofs=0):
+    """
+    Decompresses data and decodes the result into tiles with the given
+    TileCodec, without any intermediate files.
+    """
+    tile_data = decompress(data, ofs)
+    tile_size = codec.getTileSize()
+    for i in range(0, len(tile_data) - tile_size + 1, tile_size):
+        yield codec.decode(tile_data, i)
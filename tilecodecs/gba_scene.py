@@ -0,0 +1,338 @@
+from PIL import Image
+from tilecodecs.TileCodec import view_bits
+from tilecodecs import gba
+from tilecodecs import gba_sprites
+import array
+import struct
+import sys
+
+"""
+Renders complete GBA frames from memory dumps and display registers.
+Layout: http://www.coranac.com/tonc/text/video.htm and regbg.htm
+
+Supported: video modes 0-5, text and affine backgrounds, scrolling, layer
+priorities, transparency and sprites. Not supported: alpha blending,
+windows, mosaic and affine transformation of sprites and bitmap
+backgrounds.
+
+Every layer is rendered into lines of color keys. Key 0 is transparent
+and shows the backdrop, keys 1-255 are background palette entries, keys
+256-511 object palette entries and keys from 512 on are direct 15bit
+colors. The layers of a scanline are composited in one pass from the top
+layer down and converted to RGBA with a single table lookup.
+"""
+
+SCREEN_WIDTH, SCREEN_HEIGHT = gba.SCREEN_SIZE
+
+# DISPCNT bits
+DISPCNT_MODE_MASK = 0x7
+DISPCNT_PAGE = 1 << 4
+DISPCNT_OBJ_1D = 1 << 6
+DISPCNT_FORCED_BLANK = 1 << 7
+DISPCNT_BG0 = 1 << 8
+DISPCNT_OBJ = 1 << 12
+
+# Backgrounds available in each video mode, True for affine backgrounds
+MODE_BGS = (
+    {0: False, 1: False, 2: False, 3: False},
+    {0: False, 1: False, 2: True},
+    {2: True, 3: True},
+    {2: None}, {2: None}, {2: None})
+
+TEXT_BG_SIZES = ((32, 32), (64, 32), (32, 64), (64, 64))
+CHARBLOCK_SIZE = 0x4000
+SCREENBLOCK_SIZE = 0x800
+OBJ_VRAM_OFFSET = 0x10000
+OBJ_KEY_OFFSET = 256
+DIRECT_KEY_OFFSET = 512
+
+# translate tables that add the palette bank to non zero 4bpp indices
+BANK_TABLES = tuple(bytes([0] + [(bank*16 + i) & 0xFF for i in range(1, 256)])
+    for bank in range(16))
+
+def sign_extend(value, bits):
+    """
+    Interprets the lower bits of a register value as a signed int
+    """
+    value &= (1 << bits) - 1
+    if value & (1 << (bits - 1)):
+        value -= 1 << bits
+    return value
+
+class SceneRenderer(object):
+    """
+    Renders frames from VRAM, palette RAM and OAM dumps. Decoded background
+    tiles are cached by their encoded bytes, so a renderer can be reused
+    for many snapshots of the same game.
+    """
+
+    def __init__(self, max_cached_tiles=65536):
+        """
+        Arguments:
+        max_cached_tiles - The tile cache is cleared when it grows larger
+        """
+        self.max_cached_tiles = max_cached_tiles
+        # {encoded tile: 8 rows of indices as bytes}
+        self.tile_cache = {}
+
+    def get_tile_rows(self, vram, char_ofs, bpp):
+        """
+        Returns the 8 pixel rows of a background tile as bytes
+        """
+        tile_size = bpp * 8
+        encoded = bytes(vram[char_ofs:char_ofs+tile_size])
+        rows = self.tile_cache.get(encoded)
+        if rows is None:
+            if len(encoded) < tile_size:
+                encoded += bytes(tile_size - len(encoded))
+            if bpp == 8:
+                tile = gba_sprites.CODEC_8BPP.decode(encoded)
+            else:
+                tile = gba_sprites.CODEC_4BPP.decode(encoded)
+            rows = tuple(bytes(tile[i:i+8]) for i in range(0, 64, 8))
+            if len(self.tile_cache) >= self.max_cached_tiles:
+                self.tile_cache.clear()
+            self.tile_cache[encoded] = rows
+        return rows
+
+    def render(self, vram, palram, oam, dispcnt, bgcnt, bgofs=None,
+            affine=None):
+        """
+        Renders a frame into a 240x160 RGBA image.
+
+        Arguments:
+        vram - 96KB VRAM dump
+        palram - 1KB palette RAM dump, background and object palettes
+        oam - 1KB OAM dump
+        dispcnt - Value of the DISPCNT register
+        bgcnt - Values of BG0CNT-BG3CNT
+        bgofs - (BGxHOFS, BGxVOFS) for each background, defaults to 0
+        affine - Dict mapping background 2 and 3 to their raw
+                 (PA, PB, PC, PD, X, Y) register values, defaults to the
+                 identity matrix at (0, 0)
+        """
+        if dispcnt & DISPCNT_FORCED_BLANK:
+            return Image.new("RGBA", gba.SCREEN_SIZE, (255, 255, 255, 255))
+
+        vram = view_bits(vram)
+        if bgofs is None:
+            bgofs = ((0, 0),) * 4
+        if affine is None:
+            affine = {}
+        mode = dispcnt & DISPCNT_MODE_MASK
+        if mode >= len(MODE_BGS):
+            raise ValueError("Invalid video mode {}".format(mode))
+
+        # (priority, order, lines) with the lowest tuple drawn on top
+        layers = []
+        for bg, is_affine in MODE_BGS[mode].items():
+            if not dispcnt & (DISPCNT_BG0 << bg):
+                continue
+            cnt = bgcnt[bg]
+            if is_affine is None:
+                lines = self.render_bitmap_bg(vram, mode, dispcnt)
+            elif is_affine:
+                lines = self.render_affine_bg(vram, cnt, affine.get(bg))
+            else:
+                hofs, vofs = bgofs[bg]
+                lines = self.render_text_bg(vram, cnt, hofs, vofs)
+            layers.append((cnt & 3, 1 + bg, lines))
+
+        if dispcnt & DISPCNT_OBJ:
+            obj_layers = self.render_objects(vram, oam, mode, dispcnt)
+            for priority, lines in obj_layers.items():
+                layers.append((priority, 0, lines))
+
+        layers.sort(key=lambda layer: layer[:2])
+        keys = []
+        for y in range(SCREEN_HEIGHT):
+            line = None
+            for _, _, lines in layers:
+                if lines[y] is None:
+                    continue
+                if line is None:
+                    line = lines[y]
+                else:
+                    line = [a or b for a, b in zip(line, lines[y])]
+            if line is None:
+                line = bytes(SCREEN_WIDTH)
+            keys += line
+
+        lut = self.build_color_lut(palram)
+        rgba = array.array("I", map(lut.__getitem__, keys))
+        return Image.frombuffer("RGBA", gba.SCREEN_SIZE, rgba.tobytes(),
+            "raw", "RGBA", 0, 1)
+
+    def build_color_lut(self, palram):
+        """
+        Maps every color key to a native RGBA int
+        """
+        table = gba.direct_color_table()
+        colors = struct.unpack_from("<512H", palram)
+        return array.array("I", map(table.__getitem__, colors)) + \
+            table[:0x8000]
+
+    def render_text_bg(self, vram, cnt, hofs, vofs):
+        """
+        Renders the lines of a regular tiled background
+        """
+        char_base = ((cnt >> 2) & 3) * CHARBLOCK_SIZE
+        bpp = 8 if cnt & (1 << 7) else 4
+        screen_base = ((cnt >> 8) & 0x1F) * SCREENBLOCK_SIZE
+        map_w, map_h = TEXT_BG_SIZES[(cnt >> 14) & 3]
+        tile_size = bpp * 8
+        tiles_per_line = SCREEN_WIDTH // 8 + 1
+        fine_x = hofs & 7
+
+        # {map entry: rows with flips and palette bank applied}
+        entry_rows = {}
+        lines = []
+        for y in range(SCREEN_HEIGHT):
+            map_y = ((y + vofs) >> 3) & (map_h - 1)
+            fine_y = (y + vofs) & 7
+            row_ofs = (screen_base + (map_y // 32) * (map_w // 32) *
+                SCREENBLOCK_SIZE + (map_y % 32) * 64)
+            parts = []
+            for col in range(tiles_per_line):
+                map_x = ((hofs >> 3) + col) & (map_w - 1)
+                pos = row_ofs + (map_x // 32) * SCREENBLOCK_SIZE + \
+                    (map_x % 32) * 2
+                entry = vram[pos] | (vram[pos+1] << 8)
+                rows = entry_rows.get(entry)
+                if rows is None:
+                    rows = self.get_tile_rows(vram,
+                        char_base + (entry & 0x3FF) * tile_size, bpp)
+                    if bpp == 4:
+                        rows = [r.translate(BANK_TABLES[entry >> 12])
+                            for r in rows]
+                    if entry & (1 << 10):
+                        rows = [r[::-1] for r in rows]
+                    if entry & (1 << 11):
+                        rows = rows[::-1]
+                    entry_rows[entry] = rows
+                parts.append(rows[fine_y])
+            lines.append(b"".join(parts)[fine_x:fine_x+SCREEN_WIDTH])
+        return lines
+
+    def render_affine_bg(self, vram, cnt, params):
+        """
+        Renders the lines of an affine background
+        """
+        char_base = ((cnt >> 2) & 3) * CHARBLOCK_SIZE
+        screen_base = ((cnt >> 8) & 0x1F) * SCREENBLOCK_SIZE
+        map_w = gba.AFFINE_MAP_SIZES[(cnt >> 14) & 3]
+        wrap = bool(cnt & (1 << 13))
+        if params is None:
+            pa, pb, pc, pd, x_ref, y_ref = 0x100, 0, 0, 0x100, 0, 0
+        else:
+            pa, pb, pc, pd = (sign_extend(p, 16) for p in params[:4])
+            x_ref, y_ref = (sign_extend(p, 28) for p in params[4:6])
+
+        tilemap = vram[screen_base:screen_base + map_w*map_w]
+        tiles = {}
+        for tile_id in set(tilemap):
+            rows = self.get_tile_rows(vram, char_base + tile_id*64, 8)
+            tiles[tile_id] = b"".join(rows)
+        texture, tex_width = gba.affine_bg_texture(tilemap, tiles)
+        return list(gba.iter_affine_bg_lines(texture, tex_width, pa, pb, pc,
+            pd, x_ref, y_ref, wrap))
+
+    def render_bitmap_bg(self, vram, mode, dispcnt):
+        """
+        Renders the lines of background 2 in bitmap modes 3-5
+        """
+        page = 1 if dispcnt & DISPCNT_PAGE else 0
+        lines = []
+        if mode == 4:
+            start = page * gba.BITMAP_PAGE_OFFSET
+            for y in range(SCREEN_HEIGHT):
+                pos = start + y*SCREEN_WIDTH
+                lines.append(bytes(vram[pos:pos+SCREEN_WIDTH]))
+            return lines
+
+        if mode == 3:
+            start = 0
+            width, height = gba.MODE3_SIZE
+        else:
+            start = page * gba.BITMAP_PAGE_OFFSET
+            width, height = gba.MODE5_SIZE
+        colors = array.array("H", bytes(vram[start:start + width*height*2]))
+        if sys.byteorder == "big":
+            colors.byteswap()
+        padding = [0] * (SCREEN_WIDTH - width)
+        for y in range(SCREEN_HEIGHT):
+            if y >= height:
+                lines.append(None)
+                continue
+            lines.append([DIRECT_KEY_OFFSET + (c & 0x7FFF)
+                for c in colors[y*width:(y+1)*width]] + padding)
+        return lines
+
+    def render_objects(self, vram, oam, mode, dispcnt):
+        """
+        Renders all sprites. Returns a dict mapping each used priority to
+        its lines, lines without sprites of that priority are None.
+        """
+        obj_vram = vram[OBJ_VRAM_OFFSET:]
+        if dispcnt & DISPCNT_OBJ_1D:
+            mapping = gba_sprites.MAPPING_1D
+        else:
+            mapping = gba_sprites.MAPPING_2D
+        cache = {}
+
+        keys = [None] * SCREEN_HEIGHT
+        prios = [None] * SCREEN_HEIGHT
+        entries = list(gba_sprites.iter_decode_oam(oam))
+        # draw the highest OAM index first, lower indices end up on top
+        for entry in reversed(entries):
+            if not entry.is_visible():
+                continue
+            if entry.gfx_mode == gba_sprites.GFX_WINDOW:
+                continue # only defines the OBJ window, never drawn
+            if mode >= 3 and entry.tile_id < 512:
+                continue # bitmap modes use the lower half for the frame
+            pixmap = gba_sprites.decode_sprite(entry, obj_vram, mapping, cache)
+            width, height = pixmap.width, pixmap.height
+            x = entry.x - 512 if entry.x >= 256 else entry.x
+            y = entry.y - 256 if entry.y + height > 256 else entry.y
+            if entry.mode == gba_sprites.MODE_AFFINE_DOUBLE:
+                x += width // 2
+                y += height // 2
+            if entry.bpp == 4:
+                base = OBJ_KEY_OFFSET + entry.pal_id * 16
+            else:
+                base = OBJ_KEY_OFFSET
+
+            for row in range(height):
+                sy = y + row
+                if not 0 <= sy < SCREEN_HEIGHT:
+                    continue
+                if keys[sy] is None:
+                    keys[sy] = [0] * SCREEN_WIDTH
+                    prios[sy] = [0] * SCREEN_WIDTH
+                line_keys = keys[sy]
+                line_prios = prios[sy]
+                pixels = pixmap.pixels[row*width:(row+1)*width]
+                for col, index in enumerate(pixels):
+                    sx = x + col
+                    if index and 0 <= sx < SCREEN_WIDTH:
+                        line_keys[sx] = base + index
+                        line_prios[sx] = entry.priority
+
+        layers = {}
+        for sy in range(SCREEN_HEIGHT):
+            if keys[sy] is None:
+                continue
+            for priority in set(prios[sy][x] for x in range(SCREEN_WIDTH)
+                    if keys[sy][x]):
+                lines = layers.setdefault(priority, [None] * SCREEN_HEIGHT)
+                lines[sy] = [k if p == priority else 0
+                    for k, p in zip(keys[sy], prios[sy])]
+        return layers
+
+def render_scene(vram, palram, oam, dispcnt, bgcnt, bgofs=None, affine=None):
+    """
+    Renders a single frame, see SceneRenderer.render
+    """
+    return SceneRenderer().render(vram, palram, oam, dispcnt, bgcnt, bgofs,
+        affine)
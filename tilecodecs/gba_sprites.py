@@ -0,0 +1,265 @@
+from PIL import Image
+from tilecodecs import LinearCodec, Pixmap
+from tilecodecs.TileCodec import view_bits
+from tilecodecs import gba
+import struct
+
+# OAM functions
+# Layout: Section 8.2 at http://www.coranac.com/tonc/text/regobj.htm
+
+OAM_ENTRY_FMT = "<3Hh"
+OAM_ENTRY_SIZE = struct.calcsize(OAM_ENTRY_FMT)
+OAM_ENTRY_COUNT = 128
+
+MAPPING_2D = 0
+MAPPING_1D = 1
+
+MODE_NORMAL = 0
+MODE_AFFINE = 1
+MODE_HIDE = 2
+MODE_AFFINE_DOUBLE = 3
+
+GFX_NORMAL = 0
+GFX_BLEND = 1
+GFX_WINDOW = 2
+
+SHAPE_SQUARE = 0
+SHAPE_WIDE = 1
+SHAPE_TALL = 2
+
+# Sprite sizes in pixels, indexed by [shape][size]
+SPRITE_SIZES = (
+    ((8, 8), (16, 16), (32, 32), (64, 64)),
+    ((16, 8), (32, 8), (32, 16), (64, 32)),
+    ((8, 16), (8, 32), (16, 32), (32, 64)))
+
+# Tile ids are always counted in 4bpp tiles
+CHAR_SIZE = 32
+CHAR_COUNT = 1024
+CHAR_ROW_2D = 32
+
+CODEC_4BPP = LinearCodec(4, LinearCodec.REVERSE_ORDER)
+CODEC_8BPP = LinearCodec(8)
+
+class OamEntry(object):
+    """
+    Attributes of a single OAM entry
+    """
+
+    __slots__ = ("y", "mode", "gfx_mode", "mosaic", "bpp", "shape", "x",
+        "affine_id", "flip_h", "flip_v", "size", "tile_id", "priority",
+        "pal_id")
+
+    def __init__(self, attr0, attr1, attr2):
+        """
+        Unpacks the three attribute words of an OAM entry
+        """
+        self.y = attr0 & 0xFF
+        self.mode = (attr0 >> 8) & 3
+        self.gfx_mode = (attr0 >> 10) & 3
+        self.mosaic = bool(attr0 & (1 << 12))
+        self.bpp = 8 if attr0 & (1 << 13) else 4
+        self.shape = (attr0 >> 14) & 3
+
+        self.x = attr1 & 0x1FF
+        if self.is_affine():
+            self.affine_id = (attr1 >> 9) & 0x1F
+            self.flip_h = False
+            self.flip_v = False
+        else:
+            self.affine_id = None
+            self.flip_h = bool(attr1 & (1 << 12))
+            self.flip_v = bool(attr1 & (1 << 13))
+        self.size = (attr1 >> 14) & 3
+
+        self.tile_id = attr2 & 0x3FF
+        self.priority = (attr2 >> 10) & 3
+        self.pal_id = attr2 >> 12
+
+    def is_affine(self):
+        """
+        Returns True if the sprite uses an affine transformation
+        """
+        return self.mode in (MODE_AFFINE, MODE_AFFINE_DOUBLE)
+
+    def is_visible(self):
+        """
+        Returns True unless the sprite is hidden or uses the forbidden shape
+        """
+        return self.mode != MODE_HIDE and self.shape != 3
+
+    def get_dimensions(self):
+        """
+        Returns the sprite size in pixels as (width, height)
+        """
+        return SPRITE_SIZES[self.shape][self.size]
+
+def decode_oam_entry(data, ofs=0):
+    """
+    Decodes a single 8 byte OAM entry. The affine parameter stored in the
+    last halfword is ignored.
+    """
+    attr0, attr1, attr2, _ = struct.unpack_from(OAM_ENTRY_FMT, data, ofs)
+    return OamEntry(attr0, attr1, attr2)
+
+def iter_decode_oam(data):
+    """
+    Decodes all entries of an OAM dump
+    """
+    if len(data) % OAM_ENTRY_SIZE != 0:
+        raise ValueError("Data length has to be a multiple of OAM_ENTRY_SIZE")
+
+    for ofs in range(0, len(data), OAM_ENTRY_SIZE):
+        yield decode_oam_entry(data, ofs)
+
+
+# Sprite functions
+
+def iter_sprite_char_offsets(entry, mapping=MAPPING_1D):
+    """
+    Yields the byte offset into character VRAM of every tile of a sprite,
+    row by row.
+
+    Arguments:
+    entry - OamEntry of the sprite
+    mapping - MAPPING_1D or MAPPING_2D, bit 6 of DISPCNT
+    """
+    width, height = entry.get_dimensions()
+    tiles_w = width // 8
+    tiles_h = height // 8
+    units = entry.bpp // 4 # 8bpp tiles use two tile ids
+    tile_id = entry.tile_id
+
+    if mapping == MAPPING_1D:
+        row_step = tiles_w * units
+    else:
+        row_step = CHAR_ROW_2D
+        if entry.bpp == 8:
+            # The hardware ignores the lowest bit in this case
+            tile_id &= ~1
+
+    for ty in range(tiles_h):
+        for tx in range(tiles_w):
+            char_id = (tile_id + ty*row_step + tx*units) % CHAR_COUNT
+            yield char_id * CHAR_SIZE
+
+def decode_character(vram, char_ofs, bpp, cache=None):
+    """
+    Decodes a single character from object VRAM. 8bpp characters starting
+    at the last tile id wrap around to the start of VRAM. Decoded
+    characters are stored in cache by their encoded bytes, so the same dict
+    can be shared between sprites and VRAM snapshots.
+    """
+    codec = CODEC_8BPP if bpp == 8 else CODEC_4BPP
+    end = char_ofs + codec.getTileSize()
+    encoded = bytes(vram[char_ofs:end])
+    if end > len(vram):
+        encoded += bytes(vram[:end - len(vram)])
+
+    key = (bpp, encoded)
+    if cache is not None and key in cache:
+        return cache[key]
+
+    tile = codec.decode(encoded)
+    if cache is not None:
+        cache[key] = tile
+    return tile
+
+def decode_sprite(entry, vram, mapping=MAPPING_1D, cache=None):
+    """
+    Assembles the palette indices of a sprite into a Pixmap. Flips are
+    applied, affine transformations are not.
+
+    Arguments:
+    entry - OamEntry of the sprite
+    vram - Object character VRAM, the 32KB starting at VRAM offset 0x10000
+    mapping - MAPPING_1D or MAPPING_2D
+    cache - Optional dict of decoded characters, see decode_character
+    """
+    vram = view_bits(vram)
+    width, height = entry.get_dimensions()
+    tiles_w = width // 8
+
+    chars = [decode_character(vram, char_ofs, entry.bpp, cache)
+        for char_ofs in iter_sprite_char_offsets(entry, mapping)]
+
+    rows = []
+    for y in range(height):
+        first = (y // 8) * tiles_w
+        pos = (y % 8) * 8
+        row = []
+        for tile in chars[first:first+tiles_w]:
+            row += tile[pos:pos+8]
+        if entry.flip_h:
+            row.reverse()
+        rows.append(row)
+    if entry.flip_v:
+        rows.reverse()
+
+    pixels = []
+    for row in rows:
+        pixels += row
+    return Pixmap((width, height), pixels)
+
+def sprite_palette(entry, palettes):
+    """
+    Selects the colors used by a sprite. palettes is the list of 16 color
+    object palettes from gba.iter_decode_palettes, 8bpp sprites use all
+    of them as one 256 color palette.
+    """
+    if entry.bpp == 8:
+        palette = []
+        for pal in palettes:
+            palette += pal
+        return palette
+    return palettes[entry.pal_id]
+
+def sprite_image(pixmap, palette):
+    """
+    Creates an RGBA PIL Image from sprite indices. Index 0 is transparent.
+    """
+    colors = [(0,0,0,0) if c == 0 else tuple(palette[c][:3]) + (255,)
+        for c in range(len(palette))]
+    img = Image.new("RGBA", (pixmap.width, pixmap.height))
+    img.putdata(gba.color_tile(pixmap.pixels, colors))
+    return img
+
+def iter_decode_sprites(oam, vram, palettes, mapping=MAPPING_1D, cache=None):
+    """
+    Decodes every visible sprite of an OAM dump. Yields (OamEntry, Image)
+    tuples. Characters are decoded only once, even if they are used by
+    multiple sprites. A cache dict can be passed to reuse decoded
+    characters across frames, see decode_character.
+    """
+    if cache is None:
+        cache = {}
+    vram = view_bits(vram)
+    for entry in iter_decode_oam(oam):
+        if not entry.is_visible():
+            continue
+        pixmap = decode_sprite(entry, vram, mapping, cache)
+        yield entry, sprite_image(pixmap, sprite_palette(entry, palettes))
+
+def combine_sprites(images, width=256):
+    """
+    Packs sprite images into rows of a sprite sheet. The width is meassured
+    in pixels, the height is calculated automatically.
+    """
+    images = list(images)
+    positions = []
+    x = 0
+    y = 0
+    row_height = 0
+    for img in images:
+        if x + img.width > width and x > 0:
+            x = 0
+            y += row_height
+            row_height = 0
+        positions.append((x, y))
+        x += img.width
+        row_height = max(row_height, img.height)
+
+    sheet = Image.new("RGBA", (width, y + row_height))
+    for img, pos in zip(images, positions):
+        sheet.paste(img, pos)
+    return sheet